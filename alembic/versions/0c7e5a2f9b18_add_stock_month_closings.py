@@ -0,0 +1,38 @@
+"""add stock month closings
+
+Revision ID: 0c7e5a2f9b18
+Revises: f58b0e2d9a14
+Create Date: 2026-10-19 21:07:33.140962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c7e5a2f9b18'
+down_revision: Union[str, Sequence[str], None] = 'f58b0e2d9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Остатки на конец архивированных (отсоединенных) месяцев stock_movements
+    op.create_table('stock_month_closings',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'month')
+    )
+    op.create_index('ix_stock_month_closings_month', 'stock_month_closings', ['month'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_month_closings_month', table_name='stock_month_closings')
+    op.drop_table('stock_month_closings')
@@ -0,0 +1,30 @@
+"""add expenses listing indexes
+
+Revision ID: 2b8d6f1e0c34
+Revises: 91c5e7a4d2f0
+Create Date: 2026-10-19 15:20:48.092371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b8d6f1e0c34'
+down_revision: Union[str, Sequence[str], None] = '91c5e7a4d2f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_expenses_created_at_id', 'expenses', ['created_at', 'id'], unique=False)
+    op.create_index('ix_expenses_category_created_at', 'expenses', ['category', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_expenses_category_created_at', table_name='expenses')
+    op.drop_index('ix_expenses_created_at_id', table_name='expenses')
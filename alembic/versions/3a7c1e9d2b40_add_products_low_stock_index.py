@@ -0,0 +1,31 @@
+"""add products low stock index
+
+Revision ID: 3a7c1e9d2b40
+Revises: 0ddb94118ce7
+Create Date: 2026-10-19 10:12:31.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7c1e9d2b40'
+down_revision: Union[str, Sequence[str], None] = '0ddb94118ce7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_products_low_stock', 'products', ['name'], unique=False,
+        postgresql_where=sa.text('quantity < min_stock_level')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_low_stock', table_name='products')
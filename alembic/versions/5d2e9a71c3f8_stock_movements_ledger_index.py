@@ -0,0 +1,32 @@
+"""stock_movements ledger index
+
+Revision ID: 5d2e9a71c3f8
+Revises: b61f4d08e2a7
+Create Date: 2026-10-19 11:47:05.286113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e9a71c3f8'
+down_revision: Union[str, Sequence[str], None] = 'b61f4d08e2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (product_id, created_at, id) covers the old (product_id, created_at) index
+    # and gives keyset pagination a stable tie-breaker
+    op.create_index('ix_stock_movements_product_id_created_at_id', 'stock_movements', ['product_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_stock_movements_product_id_created_at', table_name='stock_movements')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_stock_movements_product_id_created_at', 'stock_movements', ['product_id', 'created_at'], unique=False)
+    op.drop_index('ix_stock_movements_product_id_created_at_id', table_name='stock_movements')
@@ -0,0 +1,39 @@
+"""add chat read markers
+
+Revision ID: 6e1f9b3a7c52
+Revises: a05c8e3f7d29
+Create Date: 2026-10-19 18:12:05.418326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1f9b3a7c52'
+down_revision: Union[str, Sequence[str], None] = 'a05c8e3f7d29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chat_read_markers',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_key', sa.String(), nullable=False),
+    sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'conversation_key')
+    )
+    op.create_index('ix_chat_messages_sender_id_id', 'chat_messages', ['sender_id', 'id'], unique=False)
+    op.create_index('ix_chat_messages_recipient_id_id', 'chat_messages', ['recipient_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_recipient_id_id', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_sender_id_id', table_name='chat_messages')
+    op.drop_table('chat_read_markers')
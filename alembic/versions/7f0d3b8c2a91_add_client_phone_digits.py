@@ -0,0 +1,41 @@
+"""add client phone digits
+
+Revision ID: 7f0d3b8c2a91
+Revises: e4a92c6d1b57
+Create Date: 2026-10-19 13:41:27.118450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f0d3b8c2a91'
+down_revision: Union[str, Sequence[str], None] = 'e4a92c6d1b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('clients', sa.Column('phone_digits', sa.String(), nullable=True))
+
+    # Заполняем для существующих клиентов: оставляем только цифры
+    op.execute("UPDATE clients SET phone_digits = regexp_replace(phone, '[^0-9]', '', 'g')")
+
+    op.create_index(
+        'ix_clients_phone_digits_prefix', 'clients', ['phone_digits'], unique=False,
+        postgresql_ops={'phone_digits': 'text_pattern_ops'}
+    )
+    op.create_index(
+        'ix_clients_phone_digits_suffix', 'clients', [sa.text('reverse(phone_digits) text_pattern_ops')], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clients_phone_digits_suffix', table_name='clients')
+    op.drop_index('ix_clients_phone_digits_prefix', table_name='clients')
+    op.drop_column('clients', 'phone_digits')
@@ -0,0 +1,31 @@
+"""add clients desc nulls last indexes
+
+Revision ID: 8d4b1f6e2c07
+Revises: 0c7e5a2f9b18
+Create Date: 2026-10-19 21:36:50.512874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4b1f6e2c07'
+down_revision: Union[str, Sequence[str], None] = '0c7e5a2f9b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Сортировка "сначала недавние, без активности в конце" (DESC NULLS LAST)
+    op.create_index('ix_clients_last_sale_at_desc', 'clients', [sa.text('last_sale_at DESC NULLS LAST'), 'id'], unique=False)
+    op.create_index('ix_clients_last_payment_at_desc', 'clients', [sa.text('last_payment_at DESC NULLS LAST'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clients_last_payment_at_desc', table_name='clients')
+    op.drop_index('ix_clients_last_sale_at_desc', table_name='clients')
@@ -0,0 +1,55 @@
+"""add client lifetime metrics
+
+Revision ID: 91c5e7a4d2f0
+Revises: 7f0d3b8c2a91
+Create Date: 2026-10-19 14:32:09.615284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '91c5e7a4d2f0'
+down_revision: Union[str, Sequence[str], None] = '7f0d3b8c2a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('clients', sa.Column('lifetime_revenue', sa.Numeric(precision=12, scale=2), server_default='0', nullable=False))
+    op.add_column('clients', sa.Column('sales_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('clients', sa.Column('last_sale_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('clients', sa.Column('last_payment_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Заполняем метрики по уже существующим продажам, возвратам и оплатам
+    op.execute("""
+        UPDATE clients c SET
+            lifetime_revenue =
+                COALESCE((SELECT SUM(s.total_amount) FROM sales s WHERE s.client_id = c.id), 0)
+                - COALESCE((SELECT SUM(r.total_refund_amount) FROM refunds r
+                            JOIN sales s ON s.id = r.sale_id WHERE s.client_id = c.id), 0),
+            sales_count = (SELECT COUNT(*) FROM sales s WHERE s.client_id = c.id),
+            last_sale_at = (SELECT MAX(s.created_at) FROM sales s WHERE s.client_id = c.id),
+            last_payment_at = (SELECT MAX(p.created_at) FROM payments p WHERE p.client_id = c.id)
+    """)
+
+    op.create_index(op.f('ix_clients_lifetime_revenue'), 'clients', ['lifetime_revenue'], unique=False)
+    op.create_index(op.f('ix_clients_sales_count'), 'clients', ['sales_count'], unique=False)
+    op.create_index(op.f('ix_clients_last_sale_at'), 'clients', ['last_sale_at'], unique=False)
+    op.create_index(op.f('ix_clients_last_payment_at'), 'clients', ['last_payment_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_clients_last_payment_at'), table_name='clients')
+    op.drop_index(op.f('ix_clients_last_sale_at'), table_name='clients')
+    op.drop_index(op.f('ix_clients_sales_count'), table_name='clients')
+    op.drop_index(op.f('ix_clients_lifetime_revenue'), table_name='clients')
+    op.drop_column('clients', 'last_payment_at')
+    op.drop_column('clients', 'last_sale_at')
+    op.drop_column('clients', 'sales_count')
+    op.drop_column('clients', 'lifetime_revenue')
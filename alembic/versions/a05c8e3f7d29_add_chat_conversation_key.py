@@ -0,0 +1,42 @@
+"""add chat conversation key
+
+Revision ID: a05c8e3f7d29
+Revises: 2b8d6f1e0c34
+Create Date: 2026-10-19 16:44:31.207558
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a05c8e3f7d29'
+down_revision: Union[str, Sequence[str], None] = '2b8d6f1e0c34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 1. Колонка сначала nullable, чтобы заполнить старые сообщения
+    op.add_column('chat_messages', sa.Column('conversation_key', sa.String(), nullable=True))
+
+    # 2. Общий чат -> 'general', личный -> 'меньший_id:больший_id'
+    op.execute("""
+        UPDATE chat_messages SET conversation_key = CASE
+            WHEN recipient_id IS NULL THEN 'general'
+            ELSE LEAST(sender_id, recipient_id) || ':' || GREATEST(sender_id, recipient_id)
+        END
+    """)
+
+    # 3. Делаем обязательной
+    op.alter_column('chat_messages', 'conversation_key', nullable=False)
+    op.create_index('ix_chat_messages_conversation_key_id', 'chat_messages', ['conversation_key', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_conversation_key_id', table_name='chat_messages')
+    op.drop_column('chat_messages', 'conversation_key')
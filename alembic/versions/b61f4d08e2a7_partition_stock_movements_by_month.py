@@ -0,0 +1,111 @@
+"""partition stock_movements by month
+
+Revision ID: b61f4d08e2a7
+Revises: 3a7c1e9d2b40
+Create Date: 2026-10-19 11:03:52.904117
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b61f4d08e2a7'
+down_revision: Union[str, Sequence[str], None] = '3a7c1e9d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months of partitions created ahead of today (the app keeps extending this on startup)
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, product_id, change_amount, type, performed_by_id, comment, created_at"
+
+
+def _month_starts(first: date, last: date):
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    # 1. Убираем старую таблицу в сторону (имена индексов уникальны в схеме)
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_old")
+    op.execute("ALTER TABLE stock_movements_old RENAME CONSTRAINT pk_stock_movements TO pk_stock_movements_old")
+    op.execute("ALTER INDEX ix_stock_movements_id RENAME TO ix_stock_movements_old_id")
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY NONE")
+
+    # 2. Партиционированная таблица. Ключ партиции обязан входить в PK
+    op.execute("""
+        CREATE TABLE stock_movements (
+            id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+            product_id INTEGER NOT NULL,
+            change_amount FLOAT NOT NULL,
+            type movementtype NOT NULL,
+            performed_by_id INTEGER NOT NULL,
+            comment VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT pk_stock_movements PRIMARY KEY (id, created_at),
+            CONSTRAINT fk_stock_movements_product_id_products FOREIGN KEY (product_id) REFERENCES products (id),
+            CONSTRAINT fk_stock_movements_performed_by_id_users FOREIGN KEY (performed_by_id) REFERENCES users (id)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index('ix_stock_movements_id', 'stock_movements', ['id'], unique=False)
+    op.create_index('ix_stock_movements_product_id_created_at', 'stock_movements', ['product_id', 'created_at'], unique=False)
+
+    # 3. Месячные партиции: от самой старой записи до MONTHS_AHEAD вперед
+    first = conn.execute(sa.text("SELECT min(created_at) FROM stock_movements_old")).scalar()
+    today = date.today()
+    first = first.date() if first else today
+    last_year, last_month = divmod(today.year * 12 + today.month - 1 + MONTHS_AHEAD, 12)
+    last = date(last_year, last_month + 1, 1)
+
+    for year, month in _month_starts(first, last):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        op.execute(
+            f"CREATE TABLE stock_movements_y{year}m{month:02d} PARTITION OF stock_movements "
+            f"FOR VALUES FROM ('{date(year, month, 1)}') TO ('{date(next_year, next_month, 1)}')"
+        )
+    # Safety net so inserts never fail if future partitions were not created in time
+    op.execute("CREATE TABLE stock_movements_default PARTITION OF stock_movements DEFAULT")
+
+    # 4. Переносим данные
+    op.execute(f"INSERT INTO stock_movements ({COLUMNS}) SELECT {COLUMNS} FROM stock_movements_old")
+    op.execute("DROP TABLE stock_movements_old")
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY stock_movements.id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_partitioned")
+    op.execute("ALTER TABLE stock_movements_partitioned RENAME CONSTRAINT pk_stock_movements TO pk_stock_movements_partitioned")
+    op.execute("ALTER INDEX ix_stock_movements_id RENAME TO ix_stock_movements_partitioned_id")
+    op.drop_index('ix_stock_movements_product_id_created_at', table_name='stock_movements_partitioned')
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE stock_movements (
+            id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+            product_id INTEGER NOT NULL,
+            change_amount FLOAT NOT NULL,
+            type movementtype NOT NULL,
+            performed_by_id INTEGER NOT NULL,
+            comment VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT pk_stock_movements PRIMARY KEY (id),
+            CONSTRAINT fk_stock_movements_product_id_products FOREIGN KEY (product_id) REFERENCES products (id),
+            CONSTRAINT fk_stock_movements_performed_by_id_users FOREIGN KEY (performed_by_id) REFERENCES users (id)
+        )
+    """)
+    op.create_index('ix_stock_movements_id', 'stock_movements', ['id'], unique=False)
+
+    # Detached (archived) months are not part of the parent anymore and are not restored
+    op.execute(f"INSERT INTO stock_movements ({COLUMNS}) SELECT {COLUMNS} FROM stock_movements_partitioned")
+    op.execute("DROP TABLE stock_movements_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY stock_movements.id")
@@ -0,0 +1,31 @@
+"""add chat client msg id
+
+Revision ID: d2a7c4f81e63
+Revises: 6e1f9b3a7c52
+Create Date: 2026-10-19 19:03:47.662190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a7c4f81e63'
+down_revision: Union[str, Sequence[str], None] = '6e1f9b3a7c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('client_msg_id', sa.String(length=64), nullable=True))
+    # NULL-ы не конфликтуют: старые сообщения и клиенты без client_msg_id не затронуты
+    op.create_index('uq_chat_messages_sender_id_client_msg_id', 'chat_messages', ['sender_id', 'client_msg_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_chat_messages_sender_id_client_msg_id', table_name='chat_messages')
+    op.drop_column('chat_messages', 'client_msg_id')
@@ -0,0 +1,30 @@
+"""add client history indexes
+
+Revision ID: e4a92c6d1b57
+Revises: c83b0f5a9e16
+Create Date: 2026-10-19 13:08:14.530962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a92c6d1b57'
+down_revision: Union[str, Sequence[str], None] = 'c83b0f5a9e16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_payments_client_id_created_at', 'payments', ['client_id', 'created_at'], unique=False)
+    op.create_index('ix_sales_client_id_created_at', 'sales', ['client_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sales_client_id_created_at', table_name='sales')
+    op.drop_index('ix_payments_client_id_created_at', table_name='payments')
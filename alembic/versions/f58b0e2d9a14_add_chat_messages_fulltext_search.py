@@ -0,0 +1,37 @@
+"""add chat messages fulltext search
+
+Revision ID: f58b0e2d9a14
+Revises: d2a7c4f81e63
+Create Date: 2026-10-19 19:41:12.905371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f58b0e2d9a14'
+down_revision: Union[str, Sequence[str], None] = 'd2a7c4f81e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # STORED generated column: заполняется для старых строк при добавлении (перезапись таблицы)
+    op.add_column('chat_messages', sa.Column(
+        'content_tsv',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', content)", persisted=True),
+        nullable=True
+    ))
+    op.create_index('ix_chat_messages_content_tsv', 'chat_messages', ['content_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_content_tsv', table_name='chat_messages', postgresql_using='gin')
+    op.drop_column('chat_messages', 'content_tsv')
@@ -10,6 +10,41 @@ class Settings:
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # How many future months of stock_movements partitions to keep created
+    STOCK_PARTITIONS_AHEAD: int = int(os.getenv("STOCK_PARTITIONS_AHEAD", "3"))
+    # How often running workers re-check them (0 = only at startup / via cron)
+    STOCK_PARTITIONS_CHECK_HOURS: float = float(os.getenv("STOCK_PARTITIONS_CHECK_HOURS", "24"))
+
+    # Max age of the in-memory SKU/barcode map. Changes made in this process
+    # reload it immediately; the TTL covers changes made by other workers.
+    PRODUCT_CODE_CACHE_TTL: int = int(os.getenv("PRODUCT_CODE_CACHE_TTL", "60"))
+
+    # --- Chat ---
+    # Messages buffered per socket before a lagging client is disconnected
+    CHAT_SEND_QUEUE_SIZE: int = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "100"))
+    # "memory" for a single process, "postgres" (LISTEN/NOTIFY) for several workers/hosts
+    CHAT_PUBSUB_BACKEND: str = os.getenv("CHAT_PUBSUB_BACKEND", "memory")
+    # Heartbeat: server pings every interval, sockets silent for the timeout are closed
+    CHAT_PING_INTERVAL: int = int(os.getenv("CHAT_PING_INTERVAL", "25"))
+    CHAT_PONG_TIMEOUT: int = int(os.getenv("CHAT_PONG_TIMEOUT", "60"))
+    # Max messages replayed on reconnect (?last_seen_id=); a bigger gap -> client resyncs via /history
+    CHAT_RESUME_LIMIT: int = int(os.getenv("CHAT_RESUME_LIMIT", "500"))
+    # Write-behind buffer: messages arriving within the window are stored with one INSERT
+    CHAT_WRITE_BATCH_SIZE: int = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+    CHAT_WRITE_WINDOW_MS: int = int(os.getenv("CHAT_WRITE_WINDOW_MS", "20"))
+
+    # --- Uploads ---
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "static/uploads")
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+    UPLOAD_ALLOWED_TYPES: list[str] = os.getenv(
+        "UPLOAD_ALLOWED_TYPES",
+        "image/jpeg,image/png,image/webp,image/gif,image/heic,application/pdf"
+    ).split(",")
+    # Image variants for chat (longest side, px) and the worker processes that build them
+    CHAT_THUMBNAIL_SIZE: int = int(os.getenv("CHAT_THUMBNAIL_SIZE", "320"))
+    CHAT_PREVIEW_SIZE: int = int(os.getenv("CHAT_PREVIEW_SIZE", "1280"))
+    CHAT_IMAGE_WORKERS: int = int(os.getenv("CHAT_IMAGE_WORKERS", "2"))
+
     # --- ВОТ ЭТОГО НЕ ХВАТАЛО ---
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
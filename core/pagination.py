@@ -0,0 +1,35 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+
+def encode_cursor(data: dict) -> str:
+    """
+    Packs keyset pagination state into an opaque URL-safe string.
+    datetimes are stored as ISO strings.
+    """
+    raw = json.dumps(
+        data,
+        default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v),
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return data
+
+def cursor_datetime(data: dict, key: str = "created_at") -> datetime:
+    try:
+        return datetime.fromisoformat(data[key])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -43,6 +43,54 @@ app.include_router(analytics_router, prefix="/api/analytics", tags=["Analytics"]
 app.include_router(expenses_router, prefix="/api/expenses", tags=["Expenses"])
 app.include_router(chat_router, prefix="/api/chat", tags=["Chat"])
 
+import asyncio
+from core.config import settings
+from db_config import SessionLocal
+from modules.inventory.partitions import ensure_stock_movement_partitions, maintain_stock_movement_partitions
+from modules.chat.manager import manager as chat_manager
+from modules.chat.images import shutdown_pool as shutdown_image_pool
+from modules.chat.static import UploadStaticFiles
+from modules.chat.uploads import upload_dir, ensure_upload_dirs, UPLOAD_URL_PREFIX
+
+# Uploaded chat files (URLs returned by /api/chat/upload)
+ensure_upload_dirs()
+app.mount(UPLOAD_URL_PREFIX.rstrip("/"), UploadStaticFiles(directory=upload_dir()), name="uploads")
+
+@app.on_event("startup")
+def create_stock_movement_partitions():
+    # Keeps next months' stock_movements partitions ready before any insert needs them
+    db = SessionLocal()
+    try:
+        ensure_stock_movement_partitions(db)
+    except Exception as e:
+        print(f"ERROR: Startup: could not create stock_movements partitions: {e}")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def schedule_stock_movement_partitions():
+    # Long-running workers keep creating next months' partitions on their own
+    if settings.STOCK_PARTITIONS_CHECK_HOURS > 0:
+        app.state.partition_task = asyncio.create_task(
+            maintain_stock_movement_partitions(settings.STOCK_PARTITIONS_CHECK_HOURS * 3600)
+        )
+
+@app.on_event("startup")
+async def start_chat_pubsub():
+    try:
+        await chat_manager.start()
+    except Exception as e:
+        # Chat keeps working inside this worker only
+        print(f"Startup: chat pub/sub backend unavailable: {e}")
+
+@app.on_event("shutdown")
+async def stop_chat_pubsub():
+    partition_task = getattr(app.state, "partition_task", None)
+    if partition_task:
+        partition_task.cancel()
+    await chat_manager.stop()
+    shutdown_image_pool()
+
 
 @app.get("/", tags=["Root"])
 def read_root():
@@ -1,7 +1,8 @@
 import typer
 import uvicorn
 import os
-from db_config import get_db
+from fastapi import HTTPException
+from db_config import get_db, SessionLocal
 cli = typer.Typer()
 
 @cli.command()
@@ -19,5 +20,97 @@ def db_upgrade(revision: str = "head"):
     typer.echo(f"Применение миграций до ревизии: {revision}")
     os.system(f"alembic upgrade {revision}")
 
+@cli.command()
+def db_partitions(months_ahead: int = 3):
+    """
+    Create stock_movements partitions for the current and upcoming months.
+    Running workers do this every STOCK_PARTITIONS_CHECK_HOURS; for deployments
+    with that disabled, schedule it from cron, e.g. daily:
+    0 3 * * * cd /app && python manage.py db-partitions
+    """
+    from modules.inventory.partitions import ensure_stock_movement_partitions
+
+    db = SessionLocal()
+    try:
+        for name in ensure_stock_movement_partitions(db, months_ahead=months_ahead):
+            typer.echo(f"OK: {name}")
+    finally:
+        db.close()
+
+def _get_user_id(db, username: str) -> int:
+    from modules.auth.models import User
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        typer.echo(f"Error: user '{username}' not found")
+        raise typer.Exit(code=1)
+    return user.id
+
+@cli.command()
+def db_detach_partition(year: int, month: int):
+    """Detach the oldest month of stock_movements so it can be archived and dropped."""
+    from modules.inventory.partitions import detach_stock_movement_partition
+
+    db = SessionLocal()
+    try:
+        name = detach_stock_movement_partition(db, year=year, month=month)
+        typer.echo(f"Detached: {name}. Archive with: pg_dump -t {name}, then DROP TABLE {name}")
+    except HTTPException as e:
+        typer.echo(f"Error: {e.detail}")
+        raise typer.Exit(code=1)
+    finally:
+        db.close()
+
+@cli.command()
+def reconcile_stock(fix: bool = False, username: str = typer.Option(None, help="Author of ADJUSTMENT movements (required with --fix)")):
+    """Compare product quantities with the stock movement ledger."""
+    from modules.inventory.reconciliation import reconcile_stock as run_reconciliation
+
+    db = SessionLocal()
+    try:
+        user_id = None
+        if fix:
+            if not username:
+                typer.echo("Error: --username is required with --fix")
+                raise typer.Exit(code=1)
+            user_id = _get_user_id(db, username)
+
+        report = run_reconciliation(db, fix=fix, user_id=user_id)
+        for item in report["drifted"]:
+            typer.echo(
+                f"#{item['product_id']} {item['name']}: quantity={item['quantity']} "
+                f"ledger={item['ledger_quantity']} drift={item['drift']:+}"
+            )
+        typer.echo(
+            f"Checked: {report['products_checked']}, drifted: {len(report['drifted'])}, fixed: {report['fixed']}"
+        )
+    finally:
+        db.close()
+
+@cli.command()
+def rebuild_client_metrics():
+    """Recompute client lifetime revenue, sales count and last sale/payment dates."""
+    from modules.clients.service import rebuild_client_metrics as rebuild
+
+    db = SessionLocal()
+    try:
+        typer.echo(f"Updated clients: {rebuild(db)}")
+    finally:
+        db.close()
+
+@cli.command()
+def gc_uploads(grace_hours: int = 24, dry_run: bool = False):
+    """Delete uploaded files that are not referenced by any chat message."""
+    from modules.chat.uploads import collect_garbage
+
+    db = SessionLocal()
+    try:
+        result = collect_garbage(db, grace_seconds=grace_hours * 3600, dry_run=dry_run)
+        for name in result["removed"]:
+            typer.echo(f"{'Would remove' if dry_run else 'Removed'}: {name}")
+        typer.echo(f"Files: {len(result['removed'])}, freed: {result['freed_bytes'] / 1024 / 1024:.1f} MB")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
@@ -6,7 +6,7 @@ import calendar
 from typing import Optional
 
 from modules.sales.models import Sale, SaleItem, Refund, RefundItem
-from modules.inventory.models import Product, StockMovement
+from modules.inventory.models import Product, StockMovement, StockMonthClosing
 from modules.expenses.models import Expense
 
 def get_analytics(db: Session, period: str, month: Optional[int] = None, year: Optional[int] = None) -> dict:
@@ -96,19 +96,35 @@ def get_monthly_stock_report(db: Session, month: int, year: int) -> list[dict]:
     
     # 2. Get all products (current state)
     products = db.query(Product).all()
+
+    # Archived month: its movements were detached, the closing snapshot is exact
+    closings = db.query(StockMonthClosing.product_id, StockMonthClosing.quantity)\
+        .filter(StockMonthClosing.month == datetime(year, month, 1).date())\
+        .all()
+    if closings:
+        closing_by_product = {product_id: float(quantity) for product_id, quantity in closings}
+        return [
+            {
+                "product_id": p.id,
+                "name": p.name,
+                "unit": p.unit,
+                "historical_quantity": closing_by_product.get(p.id, 0.0)
+            }
+            for p in products
+        ]
     
-    # 3. Get all stock movements that happened AFTER the period
+    # 3. Sum stock movements that happened AFTER the period, per product
     #    We rely on the fact that StockMovement.change_amount is the signed delta (+ or -)
-    future_movements = db.query(StockMovement).filter(
+    #    The created_at filter prunes stock_movements partitions of earlier months
+    future_deltas = db.query(
+        StockMovement.product_id,
+        func.sum(StockMovement.change_amount)
+    ).filter(
         StockMovement.created_at > end_date
-    ).all()
+    ).group_by(StockMovement.product_id).all()
     
     # 4. Aggregate deltas per product
-    product_deltas = {}
-    for movement in future_movements:
-        if movement.product_id not in product_deltas:
-            product_deltas[movement.product_id] = 0.0
-        product_deltas[movement.product_id] += float(movement.change_amount)
+    product_deltas = {product_id: float(delta or 0) for product_id, delta in future_deltas}
         
     # 5. Build the report by backtracking
     #    Historical Qty = Current Qty - Sum(Changes after date)
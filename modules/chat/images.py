@@ -0,0 +1,91 @@
+import asyncio
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from core.config import settings
+from .uploads import upload_dir, upload_url
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it images are served as uploaded
+    Image = None
+
+VARIANTS_DIR = "variants"
+# variant -> longest side in pixels
+VARIANT_SIZES = {
+    "thumb": settings.CHAT_THUMBNAIL_SIZE,
+    "preview": settings.CHAT_PREVIEW_SIZE,
+}
+
+_pool: ProcessPoolExecutor | None = None
+
+def variants_dir() -> pathlib.Path:
+    return upload_dir() / VARIANTS_DIR
+
+def variant_name(filename: str, variant: str) -> str:
+    return f"{pathlib.PurePosixPath(filename).stem}_{variant}.jpg"
+
+def make_variants(source: str, target_dir: str) -> list[str]:
+    """
+    Runs in a worker process: decodes the image once and writes every
+    size-capped JPEG variant (temp file + atomic rename). Existing variants
+    are reused, since file names come from the content hash.
+    """
+    created = []
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+        for variant, size in VARIANT_SIZES.items():
+            target = os.path.join(target_dir, variant_name(os.path.basename(source), variant))
+            if not os.path.exists(target):
+                copy = image.copy()
+                copy.thumbnail((size, size))
+                temp = f"{target}.tmp"
+                copy.save(temp, "JPEG", quality=80, optimize=True)
+                os.replace(temp, target)
+            created.append(variant)
+    return created
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.CHAT_IMAGE_WORKERS)
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def generate_variants(filename: str):
+    """
+    Builds thumbnail and preview for an uploaded image in the worker pool.
+    Scheduled as a background task after the upload response: failures are
+    only logged, clients fall back to the original image.
+    """
+    if Image is None:
+        return
+
+    source = str(upload_dir() / filename)
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_get_pool(), make_variants, source, str(variants_dir()))
+    except Exception as e:
+        print(f"Upload: could not create image variants for {filename}: {e}")
+
+def variant_urls_for(content: str) -> dict:
+    """
+    Thumbnail/preview URLs of an IMAGE upload (URL or file name).
+    Computed from the name alone, no filesystem access: right after an upload
+    they may 404 for a moment while the variants are being generated.
+    None when Pillow is not installed, since nothing would ever generate them.
+    """
+    if Image is None:
+        return {f"{variant}_url": None for variant in VARIANT_SIZES}
+    filename = pathlib.PurePosixPath(urlparse(content.strip()).path).name
+    return {
+        f"{variant}_url": upload_url(f"{VARIANTS_DIR}/{variant_name(filename, variant)}")
+        for variant in VARIANT_SIZES
+    }
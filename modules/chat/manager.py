@@ -1,44 +1,227 @@
-from typing import Dict
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
 from fastapi import WebSocket
 
+from core.config import settings
+from .pubsub import create_pubsub
+
+class ClientConnection:
+    """
+    One WebSocket of a user (a tab, a phone...).
+    Outgoing messages go through a bounded queue drained by its own writer task,
+    so a slow socket only delays itself.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer_task: asyncio.Task | None = None
+        self.closed = False
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        """Any frame from the client (a pong or a message) proves it is alive."""
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, message: dict) -> bool:
+        """Returns False if the socket fell too far behind."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def writer(self, manager: "ConnectionManager", backlog: List[dict] = ()):
+        try:
+            # Exact ids, not a high-water mark: with several workers, ids can
+            # commit out of order and a lower id may only arrive live
+            replayed = set()
+            for message in backlog:
+                await self.websocket.send_json(message)
+                if message.get("id") is not None:
+                    replayed.add(message["id"])
+
+            while True:
+                message = await self.queue.get()
+                # Live copy of a message the backlog already contained
+                if replayed and message.get("id") in replayed:
+                    replayed.discard(message["id"])
+                    continue
+                await self.websocket.send_json(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"WS Error sending to {self.user_id}: {e}")
+            await manager.drop(self)
+
 class ConnectionManager:
-    def __init__(self):
-        # Active connections: userid -> WebSocket
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(self, queue_size: int = settings.CHAT_SEND_QUEUE_SIZE):
+        # Active connections: userid -> all sockets of this user
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        self.queue_size = queue_size
+        # Delivers events to the sockets of every worker (see pubsub.py)
+        self.pubsub = create_pubsub(self._deliver)
+        self.started = False
+        self.heartbeat_task: asyncio.Task | None = None
+        self.reaped_total = 0
+        self.dropped_slow_total = 0
+        # Strong references: the loop keeps only weak ones to fire-and-forget tasks
+        self._background_tasks: Set[asyncio.Task] = set()
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"WS: User {user_id} connected. Active connections: {len(self.active_connections)}")
+    async def start(self):
+        self._ensure_heartbeat()
+        await self.pubsub.start()
+        self.started = True
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"WS: User {user_id} disconnected. Active connections: {len(self.active_connections)}")
+    async def stop(self):
+        self.started = False
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        await self.pubsub.stop()
 
-    async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
+    def _ensure_heartbeat(self):
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        """
+        Pings every socket each CHAT_PING_INTERVAL seconds and closes the ones
+        that sent nothing for CHAT_PONG_TIMEOUT seconds (dead mobile connections
+        otherwise linger until a send happens to fail).
+        """
+        while True:
+            await asyncio.sleep(settings.CHAT_PING_INTERVAL)
+            now = time.monotonic()
+            for connections in list(self.active_connections.values()):
+                for connection in list(connections):
+                    if now - connection.last_seen > settings.CHAT_PONG_TIMEOUT:
+                        print(f"WS: User {connection.user_id} stopped responding, reaping socket")
+                        self.reaped_total += 1
+                        await self.drop(connection, code=1001)
+                    else:
+                        connection.enqueue({"type": "ping"})
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        connections = [c for group in self.active_connections.values() for c in group]
+        idle = sum(1 for c in connections if now - c.last_seen > settings.CHAT_PING_INTERVAL)
+        return {
+            "users_online": len(self.active_connections),
+            "active_connections": len(connections),
+            "idle_connections": idle,
+            "reaped_total": self.reaped_total,
+            "dropped_slow_total": self.dropped_slow_total
+        }
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        load_backlog: Optional[Callable[[], Awaitable[List[dict]]]] = None
+    ) -> ClientConnection:
+        """
+        load_backlog (reconnect resume) returns the missed messages. The socket is
+        registered first, so live messages queue up while the backlog loads and
+        are sent after it: nothing falls into the gap between the two.
+        """
+        await websocket.accept()
+        connection = ClientConnection(websocket, user_id, self.queue_size)
+        self.active_connections.setdefault(user_id, set()).add(connection)
+
+        backlog = []
+        if load_backlog is not None:
             try:
-                await websocket.send_json(message)
-            except RuntimeError as e:
-                # Socket might be closed/changed state
-                print(f"WS Error sending to {user_id}: {e}")
-                self.disconnect(user_id)
+                backlog = await load_backlog()
             except Exception as e:
-                 print(f"WS Error sending to {user_id}: {e}")
+                print(f"WS: Failed to load backlog for user {user_id}: {e}")
+                backlog = [{"type": "resync"}]
+
+        connection.writer_task = asyncio.create_task(connection.writer(self, backlog))
+        self._ensure_heartbeat()
+        print(f"WS: User {user_id} connected. Active connections: {self.connection_count()}")
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        connection.closed = True
+        if connection.writer_task and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+
+        connections = self.active_connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.active_connections[connection.user_id]
+            print(f"WS: User {connection.user_id} disconnected. Active connections: {self.connection_count()}")
+
+    async def drop(self, connection: ClientConnection, code: int = 1011):
+        """Disconnects a socket that is broken or cannot keep up."""
+        if connection.closed:
+            return
+        self.disconnect(connection)
+        await self._close_socket(connection, code)
+
+    async def _close_socket(self, connection: ClientConnection, code: int):
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            # Already closed by the other side
+            pass
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    def _fan_out(self, connections, message: dict):
+        # Enqueueing never awaits, so delivery to everyone is concurrent
+        # and independent of the slowest socket
+        for connection in list(connections):
+            if connection.closed:
+                continue
+            if not connection.enqueue(message):
+                print(f"WS: User {connection.user_id} is too slow, dropping socket")
+                self.dropped_slow_total += 1
+                # Marked closed right away so the rest of a burst skips it;
+                # only the close handshake runs in the background
+                self.disconnect(connection)
+                self._spawn(self._close_socket(connection, 1013))
+
+    async def _deliver(self, event: dict):
+        """Delivers a published event to the sockets connected to this process."""
+        user_id = event.get("user_id")
+        if user_id is None:
+            for connections in list(self.active_connections.values()):
+                self._fan_out(connections, event["message"])
+        else:
+            self._fan_out(self.active_connections.get(user_id, ()), event["message"])
+        # Let the writer tasks take this message before the next event of a
+        # burst (alert loops, many NOTIFYs) is fanned out, so a burst does not
+        # overflow the queues of sockets that are keeping up
+        await asyncio.sleep(0)
+
+    async def _publish(self, event: dict):
+        if not self.started:
+            # e.g. scripts without the app lifecycle: this process only
+            await self._deliver(event)
+            return
+        try:
+            await self.pubsub.publish(event)
+        except Exception as e:
+            print(f"WS: publish failed ({e}), delivering locally only")
+            await self._deliver(event)
+
+    async def send_personal_message(self, message: dict, user_id: int):
+        await self._publish({"user_id": user_id, "message": message})
 
     async def broadcast(self, message: dict):
-        # Используем list(keys) для итерации, чтобы избежать ошибки изменения словаря во время итерации
-        # если вдруг socket отвалится и вызовет disconnect
-        for user_id in list(self.active_connections.keys()):
-            websocket = self.active_connections.get(user_id)
-            if websocket:
-                try:
-                    await websocket.send_json(message)
-                except RuntimeError:
-                    self.disconnect(user_id)
-                except Exception as e:
-                    print(f"WS Error broadcasting to {user_id}: {e}")
+        await self._publish({"user_id": None, "message": message})
 
 manager = ConnectionManager()
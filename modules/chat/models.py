@@ -1,5 +1,6 @@
 from enum import Enum
-from sqlalchemy import String, Enum as SAEnum, DateTime, func, ForeignKey, Text
+from sqlalchemy import String, Enum as SAEnum, DateTime, func, ForeignKey, Text, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db_config import Base
 
@@ -17,6 +18,34 @@ class Message(Base):
     content: Mapped[str] = mapped_column(Text, nullable=False)
     msg_type: Mapped[MessageType] = mapped_column(SAEnum(MessageType), default=MessageType.TEXT, nullable=False)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # "general" or "<min user id>:<max user id>" — same value for both sides of a private chat
+    conversation_key: Mapped[str] = mapped_column(String, nullable=False)
+    # Client-generated id: a resend after a reconnect returns the stored message instead of a copy
+    client_msg_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Full-text search; 'simple' (no stemming) fits mixed RU/EN text and order numbers.
+    # Deferred: only the search query needs it
+    content_tsv = mapped_column(
+        TSVECTOR, Computed("to_tsvector('simple', content)", persisted=True), nullable=True, deferred=True
+    )
 
     sender = relationship("modules.auth.models.User", foreign_keys=[sender_id])
     recipient = relationship("modules.auth.models.User", foreign_keys=[recipient_id])
+
+    __table_args__ = (
+        # History pages are range scans: conversation_key = ? AND id < ? ORDER BY id DESC
+        Index("ix_chat_messages_conversation_key_id", "conversation_key", "id"),
+        # Conversation list: "every message I sent or received"
+        Index("ix_chat_messages_sender_id_id", "sender_id", "id"),
+        Index("ix_chat_messages_recipient_id_id", "recipient_id", "id"),
+        Index("uq_chat_messages_sender_id_client_msg_id", "sender_id", "client_msg_id", unique=True),
+        Index("ix_chat_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
+
+class ReadMarker(Base):
+    """Last message a user has read in a conversation (unread = newer messages from others)."""
+    __tablename__ = "chat_read_markers"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    conversation_key: Mapped[str] = mapped_column(String, primary_key=True)
+    last_read_message_id: Mapped[int] = mapped_column(nullable=False, default=0)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
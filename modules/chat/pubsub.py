@@ -0,0 +1,181 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from core.config import settings
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+class InMemoryPubSub:
+    """Single process: published events go straight to the local handler."""
+
+    def __init__(self, handler: EventHandler):
+        self.handler = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: dict):
+        await self.handler(event)
+
+class PostgresPubSub:
+    """
+    Multi-worker delivery over Postgres LISTEN/NOTIFY, no extra infrastructure.
+    Every worker LISTENs on one channel; a worker publishing an event receives
+    it back like everyone else and delivers it to its own sockets.
+    NOTIFY payloads are limited to 8000 bytes, so larger events are split into parts.
+    """
+
+    CHANNEL = "chat_events"
+    # 1000 characters stay below the limit even if every one of them is escaped
+    PART_SIZE = 1000
+    RECONNECT_DELAY = 2
+    # Parts of one event arrive in a single transaction; an event still
+    # incomplete after this long lost its other parts (sender crash, reconnect)
+    PARTS_TTL = 30
+
+    def __init__(self, handler: EventHandler, dsn: str):
+        self.handler = handler
+        self.dsn = dsn.replace("postgresql+psycopg2://", "postgresql://", 1)
+        self.listen_conn = None
+        self.notify_conn = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # event id -> (first part received at, parts)
+        self._parts: Dict[str, Tuple[float, List[str | None]]] = {}
+        self._reconnect_task: asyncio.Task | None = None
+        self._dispatch_task: asyncio.Task | None = None
+        self._events: asyncio.Queue | None = None
+        self._stopping = False
+        self._notify_lock = asyncio.Lock()
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._events = asyncio.Queue()
+        self._dispatch_task = self.loop.create_task(self._dispatch())
+        await self._listen()
+
+    async def _dispatch(self):
+        # One event at a time, in NOTIFY order: a poll that returns many
+        # notifications must not fan them all out before any socket writes
+        while True:
+            event = await self._events.get()
+            try:
+                await self.handler(event)
+            except Exception as e:
+                print(f"Chat: failed to deliver event: {e}")
+
+    async def _listen(self):
+        # Parts that were in flight on a lost connection will never complete
+        self._parts.clear()
+        self.listen_conn = await asyncio.to_thread(self._connect)
+        with self.listen_conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.CHANNEL}")
+        self.loop.add_reader(self.listen_conn.fileno(), self._on_readable)
+        print(f"Chat: listening on Postgres channel '{self.CHANNEL}'")
+
+    async def stop(self):
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+        self._close_listener()
+        if self.notify_conn is not None:
+            self.notify_conn.close()
+            self.notify_conn = None
+
+    def _close_listener(self):
+        if self.listen_conn is not None:
+            try:
+                self.loop.remove_reader(self.listen_conn.fileno())
+                self.listen_conn.close()
+            except Exception:
+                pass
+            self.listen_conn = None
+
+    def _on_readable(self):
+        try:
+            self.listen_conn.poll()
+        except Exception as e:
+            print(f"Chat: LISTEN connection lost: {e}")
+            self._close_listener()
+            if not self._stopping:
+                self._reconnect_task = self.loop.create_task(self._reconnect())
+            return
+
+        while self.listen_conn.notifies:
+            notify = self.listen_conn.notifies.pop(0)
+            event = self._assemble(notify.payload)
+            if event is not None:
+                self._events.put_nowait(event)
+
+    async def _reconnect(self):
+        while not self._stopping:
+            await asyncio.sleep(self.RECONNECT_DELAY)
+            try:
+                await self._listen()
+                return
+            except Exception as e:
+                print(f"Chat: LISTEN reconnect failed: {e}")
+
+    def _assemble(self, payload: str) -> dict | None:
+        data = json.loads(payload)
+        if "part" not in data:
+            return data
+
+        now = time.monotonic()
+        for event_id in [k for k, (received_at, _) in self._parts.items() if now - received_at > self.PARTS_TTL]:
+            print(f"Chat: dropping incomplete event {event_id}")
+            del self._parts[event_id]
+
+        _, parts = self._parts.setdefault(data["id"], (now, [None] * data["of"]))
+        parts[data["part"]] = data["data"]
+        if any(p is None for p in parts):
+            return None
+        del self._parts[data["id"]]
+        return json.loads("".join(parts))
+
+    def _notify(self, payloads: List[str]):
+        if self.notify_conn is None or self.notify_conn.closed:
+            self.notify_conn = self._connect()
+        # One transaction: parts are delivered together and in order on commit
+        with self.notify_conn.cursor() as cur:
+            cur.execute("BEGIN")
+            for payload in payloads:
+                cur.execute("SELECT pg_notify(%s, %s)", (self.CHANNEL, payload))
+            cur.execute("COMMIT")
+
+    async def publish(self, event: dict):
+        payload = json.dumps(event, ensure_ascii=False, default=str)
+        if len(payload) <= self.PART_SIZE:
+            payloads = [payload]
+        else:
+            event_id = uuid.uuid4().hex
+            chunks = [payload[i:i + self.PART_SIZE] for i in range(0, len(payload), self.PART_SIZE)]
+            payloads = [
+                json.dumps({"id": event_id, "part": n, "of": len(chunks), "data": chunk}, ensure_ascii=False)
+                for n, chunk in enumerate(chunks)
+            ]
+        # psycopg2 is blocking: keep it off the event loop. The lock keeps
+        # the shared publishing connection to one transaction at a time.
+        async with self._notify_lock:
+            await asyncio.to_thread(self._notify, payloads)
+
+def create_pubsub(handler: EventHandler):
+    if settings.CHAT_PUBSUB_BACKEND == "postgres":
+        return PostgresPubSub(handler, settings.SQLALCHEMY_DATABASE_URI)
+    return InMemoryPubSub(handler)
@@ -1,39 +1,72 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, UploadFile, File, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, WebSocket, WebSocketDisconnect, UploadFile, File, Query
 from sqlalchemy.orm import Session
+import asyncio
 import json
-import shutil
-import pathlib
-import uuid
 from pydantic import ValidationError
 
-from db_config import get_db
-from modules.auth.dependencies import get_current_active_user
+from core.config import settings
+from db_config import get_db, SessionLocal
+from modules.auth.dependencies import get_current_active_user, require_admin
 from modules.auth.models import User
 from modules.auth.service import get_current_user_from_token 
 
 from . import service, schemas
 from .manager import manager
+from .writer import message_writer
+from .uploads import save_upload, upload_url
+from .images import generate_variants, variant_urls_for
 
 router = APIRouter()
 
+def authenticate_websocket(token: str) -> Optional[User]:
+    """
+    Short-lived session just for the token check: a chat socket lives for hours
+    and must not keep a pooled connection checked out while idle.
+    """
+    db = SessionLocal()
+    try:
+        return get_current_user_from_token(db, token)
+    finally:
+        # The user stays usable detached: id/username are already loaded
+        db.close()
+
+def load_missed_messages(user_id: int, last_seen_id: int) -> List[dict]:
+    """
+    Messages sent while the client was offline, ready to send.
+    If the gap is too big the client gets {"type": "resync"} and reloads /history.
+    """
+    db = SessionLocal()
+    try:
+        messages = service.get_missed_messages(db, user_id, last_seen_id, settings.CHAT_RESUME_LIMIT + 1)
+        if len(messages) > settings.CHAT_RESUME_LIMIT:
+            return [{"type": "resync"}]
+        return [schemas.MessageRead.model_validate(msg).model_dump(mode='json') for msg in messages]
+    finally:
+        db.close()
+
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket, 
-    token: str = Query(...), 
-    db: Session = Depends(get_db)
+    token: str = Query(...),
+    last_seen_id: Optional[int] = Query(None)
 ):
     # 1. Авторизация по токену из URL (Query Parameter)
     # Используем сервисную функцию, которая декодирует JWT и ищет пользователя в БД
-    user = get_current_user_from_token(db, token)
+    # (в отдельном потоке и с короткой сессией, соединение сразу возвращается в пул)
+    user = await asyncio.to_thread(authenticate_websocket, token)
     if not user:
         # 4003: Forbidden (Authenticated but not authorized, or token invalid)
         print("WS: Authentication failed. closing connection.")
         await websocket.close(code=4003)
         return
 
-    # 2. Подключение
-    await manager.connect(websocket, user.id)
+    # 2. Подключение (у пользователя может быть несколько вкладок/устройств)
+    # При переподключении с last_seen_id сначала досылаем пропущенное
+    load_backlog = None
+    if last_seen_id is not None:
+        load_backlog = lambda: asyncio.to_thread(load_missed_messages, user.id, last_seen_id)
+    connection = await manager.connect(websocket, user.id, load_backlog)
     
     try:
         while True:
@@ -42,13 +75,20 @@ async def websocket_endpoint(
                 data = await websocket.receive_json()
             except json.JSONDecodeError:
                 print(f"WS: Received invalid JSON from user {user.id}")
-                await websocket.send_json({"error": "Invalid JSON format"})
+                connection.enqueue({"error": "Invalid JSON format"})
                 continue
             except ValueError: 
                  # Starlette/FastAPI raises ValueError for invalid JSON sometimes
                  print(f"WS: Value Error (Invalid JSON) from user {user.id}")
                  continue
 
+            # Heartbeat: любое сообщение от клиента = он жив
+            connection.touch()
+            if isinstance(data, dict) and data.get("type") in ("ping", "pong"):
+                if data["type"] == "ping":
+                    connection.enqueue({"type": "pong"})
+                continue
+
             # 4. Валидация и Сохранение в БД
             try:
                 # Ensure msg_type is uppercase
@@ -59,21 +99,32 @@ async def websocket_endpoint(
                 message_data = schemas.MessageCreate(
                     content=data.get("content"),
                     msg_type=raw_msg_type,
-                    recipient_id=data.get("recipient_id")
+                    recipient_id=data.get("recipient_id"),
+                    client_msg_id=data.get("client_msg_id")
                 )
-                saved_message = service.create_message(db, message_data, user.id)
+                # Сохранение идет в фоне пачками, event loop не блокируется
+                saved_message = await message_writer.save(message_data, user.id)
             except ValidationError as e:
                 print(f"WS: Validation Error: {e}")
-                await websocket.send_json({"error": "Validation Error", "details": str(e)})
+                connection.enqueue({"error": "Validation Error", "details": str(e)})
                 continue
             except Exception as e:
                 print(f"WS: Error saving message: {e}")
-                await websocket.send_json({"error": "Failed to process message"})
+                connection.enqueue({"error": "Failed to process message"})
                 continue
             
             # Подготавливаем ответ (Преобразуем в dict для JSON-сериализации)
+            saved_message.sender_name = user.username # Имя берем из уже авторизованного пользователя
+            if saved_message.msg_type == schemas.MessageType.IMAGE:
+                urls = variant_urls_for(saved_message.content)
+                saved_message.thumbnail_url = urls["thumb_url"]
+                saved_message.preview_url = urls["preview_url"]
             response_payload = schemas.MessageRead.model_validate(saved_message).model_dump(mode='json')
-            response_payload['sender_name'] = user.username # Принудительно добавляем имя
+
+            # Повторная отправка (клиент не получил подтверждение): уже разослано, отвечаем только ему
+            if getattr(saved_message, "duplicate", False):
+                connection.enqueue(response_payload)
+                continue
 
             # 5. Отправляем
             if message_data.recipient_id:
@@ -88,44 +139,94 @@ async def websocket_endpoint(
                 await manager.broadcast(response_payload)
 
     except WebSocketDisconnect:
-        manager.disconnect(user.id)
+        manager.disconnect(connection)
     except Exception as e:
         print(f"WS Endpoint Critical Error: {e}")
         # Пытаемся отключить пользователя, если соединение еще живо
-        manager.disconnect(user.id)
+        manager.disconnect(connection)
+
+@router.get("/metrics")
+def read_connection_metrics(
+    current_user: User = Depends(require_admin)
+):
+    """
+    Состояние WebSocket-соединений этого воркера.
+    """
+    return manager.metrics()
 
 @router.get("/history", response_model=List[schemas.MessageRead])
 def read_history(
     recipient_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=service.HISTORY_MAX_LIMIT),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Получить историю сообщений.
     Если recipient_id не указан -> возвращает Общий чат.
+    before_id -> более старые сообщения, after_id -> более новые.
     """
-    return service.get_chat_history(db, current_user.id, recipient_id)
+    return service.get_chat_history(
+        db, current_user.id, recipient_id, before_id=before_id, after_id=after_id, limit=limit
+    )
 
-@router.post("/upload")
+@router.get("/search", response_model=schemas.MessageSearchPage)
+def search_messages(
+    q: str = Query(..., min_length=2, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=service.HISTORY_MAX_LIMIT),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Поиск по сообщениям (номера заказов, имена клиентов...).
+    Только общий чат и личные диалоги текущего пользователя.
+    Поддерживает синтаксис "фраза", OR, -слово.
+    """
+    return service.search_messages(db, current_user.id, q, cursor=cursor, limit=limit)
+
+@router.get("/conversations", response_model=List[schemas.ConversationRead])
+def read_conversations(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Список диалогов для боковой панели: последнее сообщение и число непрочитанных.
+    """
+    return service.get_conversations(db, current_user.id)
+
+@router.post("/read", status_code=204)
+def mark_conversation_read(
+    marker: schemas.ReadMarkerUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Отметить диалог прочитанным до message_id (например, пришло по WebSocket).
+    """
+    service.mark_read(db, current_user.id, marker.recipient_id, marker.message_id)
+
+@router.post("/upload", response_model=schemas.UploadRead)
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user)
 ):
-    # Create static/uploads directory if not exists
-    upload_dir = pathlib.Path("static/uploads")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = pathlib.Path(file.filename).suffix
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
-    
-    # Save file
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to upload file: {e}")
+    # Файл пишется на диск кусками в отдельном потоке: event loop не блокируется
+    filename = await save_upload(file)
+
+    # Миниатюра и превью для картинок: строятся в пуле процессов уже после ответа,
+    # их URL известны заранее (по имени файла)
+    variants = {"thumb_url": None, "preview_url": None}
+    if file.content_type and file.content_type.startswith("image/"):
+        background_tasks.add_task(generate_variants, filename)
+        variants = variant_urls_for(filename)
         
     # Return URL
-    return {"url": f"/static/uploads/{unique_filename}"}
\ No newline at end of file
+    return {
+        "url": upload_url(filename),
+        "thumbnail_url": variants["thumb_url"],
+        "preview_url": variants["preview_url"]
+    }
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 class MessageType(str, Enum):
     TEXT = "TEXT"
@@ -12,6 +12,7 @@ class MessageBase(BaseModel):
     content: str
     msg_type: MessageType = MessageType.TEXT
     recipient_id: Optional[int] = None # Если None -> Общий чат
+    client_msg_id: Optional[str] = Field(None, max_length=64) # Для повторной отправки без дублей
 
 class MessageCreate(MessageBase):
     pass
@@ -21,5 +22,30 @@ class MessageRead(MessageBase):
     sender_id: int
     created_at: datetime
     sender_name: str # Имя отправителя (мы его достанем из базы)
+    thumbnail_url: Optional[str] = None # Только для IMAGE
+    preview_url: Optional[str] = None
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class UploadRead(BaseModel):
+    url: str
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+
+class ConversationRead(BaseModel):
+    conversation_key: str
+    recipient_id: Optional[int] = None # None -> Общий чат
+    recipient_name: Optional[str] = None
+    last_message: MessageRead
+    unread_count: int # Не больше 100: клиент показывает "99+"
+
+class ReadMarkerUpdate(BaseModel):
+    recipient_id: Optional[int] = None
+    message_id: int
+
+class MessageSearchHit(MessageRead):
+    rank: float
+
+class MessageSearchPage(BaseModel):
+    items: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
@@ -1,51 +1,299 @@
+from fastapi import HTTPException
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, and_
-from typing import List, Optional
-from .models import Message, MessageType
+from sqlalchemy import or_, and_, insert, select, func, tuple_, union_all, literal, null, cast, true, String, Integer, Double
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Optional, Tuple
+from .models import Message, MessageType, ReadMarker
 from .schemas import MessageCreate
 from modules.auth.models import User
+from .images import variant_urls_for
+from core.pagination import encode_cursor, decode_cursor
 
-def create_message(db: Session, message_data: MessageCreate, sender_id: int) -> Message:
-    db_message = Message(
-        sender_id=sender_id,
-        recipient_id=message_data.recipient_id,
-        content=message_data.content,
-        msg_type=message_data.msg_type
+GENERAL_CONVERSATION = "general"
+HISTORY_MAX_LIMIT = 200
+SEARCH_CONFIG = "simple" # must match the content_tsv expression
+UNREAD_COUNT_CAP = 100 # the sidebar shows "99+" beyond this, no need to count further
+
+def conversation_key(user_id: int, recipient_id: Optional[int]) -> str:
+    if recipient_id is None:
+        return GENERAL_CONVERSATION
+    low, high = sorted((user_id, recipient_id))
+    return f"{low}:{high}"
+
+def _visible_to(user_id: int):
+    """General chat plus the user's own private conversations."""
+    return or_(
+        Message.conversation_key == GENERAL_CONVERSATION,
+        Message.sender_id == user_id,
+        Message.recipient_id == user_id
     )
-    db.add(db_message)
+
+def create_message(db: Session, message_data: MessageCreate, sender_id: int) -> Message:
+    return create_messages(db, [(message_data, sender_id)])[0]
+
+def create_messages(db: Session, items: List[Tuple[MessageCreate, int]]) -> List[Message]:
+    """
+    Inserts several messages with one INSERT ... RETURNING and one commit.
+    A message whose (sender_id, client_msg_id) is already stored is a retried
+    send: the stored row is returned with `duplicate = True` instead.
+    The caller fills sender_name: it already knows the authenticated user.
+    """
+    keys = [(sender_id, data.client_msg_id) for data, sender_id in items if data.client_msg_id]
+    existing = {}
+    if keys:
+        stored = db.scalars(
+            select(Message).where(tuple_(Message.sender_id, Message.client_msg_id).in_(keys))
+        ).all()
+        for message in stored:
+            message.duplicate = True
+            existing[(message.sender_id, message.client_msg_id)] = message
+
+    new_items = [
+        (data, sender_id) for data, sender_id in items
+        if (sender_id, data.client_msg_id) not in existing
+    ]
+    inserted = iter(db.scalars(
+        insert(Message).returning(Message, sort_by_parameter_order=True),
+        [
+            {
+                "sender_id": sender_id,
+                "recipient_id": message_data.recipient_id,
+                "content": message_data.content,
+                "msg_type": message_data.msg_type,
+                "conversation_key": conversation_key(sender_id, message_data.recipient_id),
+                "client_msg_id": message_data.client_msg_id
+            }
+            for message_data, sender_id in new_items
+        ]
+    ).all() if new_items else [])
     db.commit()
-    db.refresh(db_message)
-    
-    # Eager load sender for immediate return if needed
-    db_message.sender_name = db.query(User).filter(User.id == sender_id).first().username
-    return db_message
+
+    return [
+        existing.get((sender_id, data.client_msg_id)) or next(inserted)
+        for data, sender_id in items
+    ]
 
 def get_chat_history(
     db: Session, 
     user_id: int, 
     recipient_id: Optional[int] = None, 
-    skip: int = 0, 
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
     limit: int = 50
 ) -> List[Message]:
-    
-    query = db.query(Message).options(joinedload(Message.sender))
-
-    if recipient_id:
-        # Private Chat: (Sender=Me AND Recipient=Them) OR (Sender=Them AND Recipient=Me)
-        query = query.filter(
-            or_(
-                and_(Message.sender_id == user_id, Message.recipient_id == recipient_id),
-                and_(Message.sender_id == recipient_id, Message.recipient_id == user_id)
-            )
+    """
+    One page of a conversation, newest first.
+    - before_id: older messages (scrolling back)
+    - after_id: newer messages (catching up)
+    Both are index range scans over (conversation_key, id).
+    """
+    limit = min(limit, HISTORY_MAX_LIMIT)
+    key = conversation_key(user_id, recipient_id)
+
+    # Latest page opened -> the conversation is read up to the page's newest message.
+    # Marked (and committed) before loading, so the commit does not expire the rows
+    # being returned and everything stays on the request's one connection.
+    if before_id is None:
+        page_ids = select(Message.id).where(Message.conversation_key == key)
+        if after_id is not None:
+            page_ids = page_ids.where(Message.id > after_id).order_by(Message.id.asc())
+        else:
+            page_ids = page_ids.order_by(Message.id.desc())
+        page_ids = page_ids.limit(limit).subquery()
+        newest = func.max(page_ids.c.id)
+
+        stmt = pg_insert(ReadMarker).from_select(
+            ["user_id", "conversation_key", "last_read_message_id"],
+            # No row (and no marker change) for an empty page
+            select(literal(user_id), literal(key), newest).having(newest.isnot(None))
         )
-    else:
-        # General Chat: Recipient is NULL
-        query = query.filter(Message.recipient_id == None)
+        db.execute(_advance_marker(stmt))
+        db.commit()
+
+    query = db.query(Message).options(joinedload(Message.sender))\
+        .filter(Message.conversation_key == key)
 
-    messages = query.order_by(Message.created_at.desc()).offset(skip).limit(limit).all()
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+
+    if after_id is not None:
+        # Oldest first so the page starts right after after_id, then flip
+        messages = query.filter(Message.id > after_id).order_by(Message.id.asc()).limit(limit).all()
+        messages.reverse()
+    else:
+        messages = query.order_by(Message.id.desc()).limit(limit).all()
     
+    _fill_display_fields(messages)
+    return messages
+
+def get_missed_messages(db: Session, user_id: int, after_id: int, limit: int) -> List[Message]:
+    """
+    Everything the user could see that arrived after after_id (reconnect resume),
+    oldest first. The visibility filter is a BitmapOr of id ranges over the
+    (conversation_key, id), (sender_id, id) and (recipient_id, id) indexes.
+    """
+    messages = db.query(Message).options(joinedload(Message.sender))\
+        .filter(
+            Message.id > after_id,
+            _visible_to(user_id)
+        )\
+        .order_by(Message.id.asc())\
+        .limit(limit)\
+        .all()
+    _fill_display_fields(messages)
+    return messages
+
+def _fill_display_fields(messages: List[Message]):
     # Populate sender_name flattened field
     for msg in messages:
         msg.sender_name = msg.sender.username if msg.sender else "Unknown"
+        if msg.msg_type == MessageType.IMAGE:
+            urls = variant_urls_for(msg.content)
+            msg.thumbnail_url = urls["thumb_url"]
+            msg.preview_url = urls["preview_url"]
 
-    return messages
+def mark_read(db: Session, user_id: int, recipient_id: Optional[int], message_id: int):
+    """Moves the user's read marker forward to message_id."""
+    stmt = pg_insert(ReadMarker).values(
+        user_id=user_id,
+        conversation_key=conversation_key(user_id, recipient_id),
+        last_read_message_id=message_id
+    )
+    db.execute(_advance_marker(stmt))
+    db.commit()
+
+def _advance_marker(stmt):
+    # Upsert that never moves a marker back: an old tab must not resurrect unread messages
+    return stmt.on_conflict_do_update(
+        index_elements=[ReadMarker.user_id, ReadMarker.conversation_key],
+        set_={
+            "last_read_message_id": func.greatest(ReadMarker.last_read_message_id, stmt.excluded.last_read_message_id),
+            "updated_at": func.now()
+        }
+    )
+
+def get_conversations(db: Session, user_id: int) -> List[dict]:
+    """
+    Chat sidebar: the last message of every conversation the user has, with the
+    number of unread messages from others (capped at UNREAD_COUNT_CAP).
+
+    Candidate conversations are "general" plus one key per row of `users`; for
+    each key the last message and the unread count are LATERAL range scans on
+    (conversation_key, id), and keys without messages drop out of the inner join.
+    Why not DISTINCT ON over the user's messages: that has to read every visible
+    message (the whole general chat included), and even just finding the user's
+    actual partners means scanning all of their private messages, so the cost
+    grows with history. Enumerating users instead costs one or two index probes
+    per staff account (a few dozen rows here) and stays flat as the message
+    table grows. If `users` ever gets large, keep a per-user partner list
+    (e.g. from chat_read_markers) and use it as the key source instead.
+    """
+    partner_key = cast(func.least(User.id, user_id), String) + ":" + cast(func.greatest(User.id, user_id), String)
+    keys = union_all(
+        select(
+            literal(GENERAL_CONVERSATION).label("conversation_key"),
+            cast(null(), Integer).label("partner_id"),
+            cast(null(), String).label("partner_name")
+        ),
+        select(partner_key.label("conversation_key"), User.id, User.username)
+    ).subquery("conversation_keys")
+
+    last_message = select(Message.id)\
+        .where(Message.conversation_key == keys.c.conversation_key)\
+        .order_by(Message.id.desc())\
+        .limit(1)\
+        .lateral("last_message")
+
+    unread = select(Message.id)\
+        .where(
+            Message.conversation_key == keys.c.conversation_key,
+            Message.id > func.coalesce(ReadMarker.last_read_message_id, 0),
+            Message.sender_id != user_id
+        )\
+        .limit(UNREAD_COUNT_CAP)\
+        .lateral("unread")
+
+    rows = db.execute(
+        select(
+            keys.c.conversation_key,
+            keys.c.partner_id,
+            keys.c.partner_name,
+            last_message.c.id,
+            func.count(unread.c.id)
+        )
+        .select_from(keys)
+        .outerjoin(ReadMarker, and_(
+            ReadMarker.user_id == user_id,
+            ReadMarker.conversation_key == keys.c.conversation_key
+        ))
+        .join(last_message, true())
+        .outerjoin(unread, true())
+        .group_by(keys.c.conversation_key, keys.c.partner_id, keys.c.partner_name, last_message.c.id)
+        .order_by(last_message.c.id.desc())
+    ).all()
+
+    messages = db.query(Message).options(joinedload(Message.sender))\
+        .filter(Message.id.in_([row[3] for row in rows]))\
+        .all()
+    _fill_display_fields(messages)
+    messages_by_id = {message.id: message for message in messages}
+
+    return [
+        {
+            "conversation_key": key,
+            "recipient_id": partner_id,
+            "recipient_name": partner_name,
+            "last_message": messages_by_id[last_message_id],
+            "unread_count": unread_count
+        }
+        for key, partner_id, partner_name, last_message_id, unread_count in rows
+        if last_message_id in messages_by_id
+    ]
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = 50
+) -> dict:
+    """
+    Full-text search over the messages the user can see, best match first.
+    Matches come from the GIN index on content_tsv; pages continue from
+    (rank, id) of the last hit.
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    # ts_rank is real (float4); as double precision the value survives the
+    # JSON cursor round trip exactly, so the keyset neither repeats nor skips ties
+    rank = cast(func.ts_rank(Message.content_tsv, ts_query), Double)
+
+    stmt = select(Message, rank.label("rank"))\
+        .options(joinedload(Message.sender))\
+        .where(
+            Message.content_tsv.bool_op("@@")(ts_query),
+            Message.msg_type != MessageType.IMAGE, # content is a file URL
+            _visible_to(user_id)
+        )
+
+    position = decode_cursor(cursor)
+    if position:
+        try:
+            last_rank, last_id = float(position["rank"]), int(position["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(rank, Message.id) < tuple_(last_rank, last_id))
+
+    rows = db.execute(stmt.order_by(rank.desc(), Message.id.desc()).limit(limit)).all()
+
+    items = []
+    for message, message_rank in rows:
+        message.rank = message_rank
+        items.append(message)
+    _fill_display_fields(items)
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor({"rank": last.rank, "id": last.id})
+
+    return {"items": items, "next_cursor": next_cursor}
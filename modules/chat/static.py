@@ -0,0 +1,36 @@
+import re
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# "<sha256>.<ext>" originals and "<sha256>_<variant>.jpg" thumbnails never change
+CONTENT_ADDRESSED = re.compile(r"(^|/)[0-9a-f]{64}(_[a-z]+)?(\.[a-z0-9]+)?$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+DEFAULT = "public, max-age=86400"
+# Shown inline; anything else (PDF, SVG, unknown) is downloaded, never rendered on the API origin
+INLINE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/heic")
+
+class UploadStaticFiles(StaticFiles):
+    """
+    Serves chat uploads.
+    Starlette's FileResponse already provides ETag / Last-Modified with 304
+    answers, Range requests and zero-copy sending when the server supports the
+    pathsend extension; this adds long-lived cache headers for content-addressed
+    files, hides in-progress temp files and keeps browsers from rendering
+    uploads as active content (nosniff, attachment for non-images).
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.split("/")):
+            raise StarletteHTTPException(status_code=404)
+
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if CONTENT_ADDRESSED.search(path) else DEFAULT
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if response.status_code in (200, 206) and content_type not in INLINE_TYPES:
+            response.headers["Content-Disposition"] = "attachment"
+        return response
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import pathlib
+import re
+import tempfile
+import time
+from urllib.parse import urlparse
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from .models import Message, MessageType
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_URL_PREFIX = "/static/uploads/"
+SAFE_EXTENSION = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+# Preferred extensions where mimetypes has none or picks an odd one (".jpe")
+EXTENSIONS = {"image/jpeg": ".jpg", "image/heic": ".heic"}
+HEIC_BRANDS = (b"heic", b"heix", b"hevc", b"hevx", b"mif1", b"msf1")
+
+def _matches_signature(content_type: str, head: bytes) -> bool:
+    """
+    The declared content type is only a client claim: the leading bytes must
+    agree with it. Types without a known signature are not checked.
+    """
+    if content_type == "image/jpeg":
+        return head.startswith(b"\xff\xd8\xff")
+    if content_type == "image/png":
+        return head.startswith(b"\x89PNG\r\n\x1a\n")
+    if content_type == "image/gif":
+        return head.startswith((b"GIF87a", b"GIF89a"))
+    if content_type == "image/webp":
+        return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    if content_type == "image/heic":
+        return head[4:8] == b"ftyp" and head[8:12] in HEIC_BRANDS
+    if content_type == "application/pdf":
+        return head.startswith(b"%PDF-")
+    return True
+
+def upload_dir() -> pathlib.Path:
+    return pathlib.Path(settings.UPLOAD_DIR)
+
+def ensure_upload_dirs():
+    """Creates the upload and variants folders; called once at startup."""
+    (upload_dir() / "variants").mkdir(parents=True, exist_ok=True)
+
+def upload_url(name: str) -> str:
+    return f"{UPLOAD_URL_PREFIX}{name}"
+
+def _extension(content_type: str) -> str:
+    """
+    Extension from the validated content type, never from the client file name:
+    "x.html" declared as image/png must not be served back as text/html.
+    """
+    suffix = EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ""
+    return suffix.lower() if SAFE_EXTENSION.match(suffix) else ""
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+def _store(temp_path: str, target: pathlib.Path):
+    try:
+        # Same content was uploaded before: keep the existing file, but restart
+        # its gc grace period so an unreferenced old copy is not collected
+        # between this upload and the message that uses it
+        os.utime(target)
+    except FileNotFoundError:
+        os.replace(temp_path, target)
+        return
+
+    os.remove(temp_path)
+    for variant in (target.parent / "variants").glob(f"{target.stem}_*"):
+        try:
+            os.utime(variant)
+        except FileNotFoundError:
+            pass
+
+async def save_upload(file: UploadFile) -> str:
+    """
+    Streams an upload to disk chunk by chunk without blocking the event loop.
+    - Content type and size (UPLOAD_MAX_BYTES) are checked before and while copying;
+      the first bytes must match the declared type's file signature.
+    - Data goes to a temp file in the upload dir and is renamed into place atomically,
+      so a half-written file is never visible under its final name.
+    - The file is named after the SHA-256 of its content, so identical uploads
+      are stored once.
+    Returns the stored file name.
+    """
+    if file.content_type not in settings.UPLOAD_ALLOWED_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {file.content_type}")
+    if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File is too large")
+
+    directory = upload_dir()
+    fd, temp_path = await asyncio.to_thread(tempfile.mkstemp, dir=directory, prefix=".upload-")
+    try:
+        size = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                if size == 0 and not _matches_signature(file.content_type, chunk):
+                    raise HTTPException(status_code=415, detail=f"File content is not {file.content_type}")
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="File is too large")
+                await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+
+        filename = f"{digest.hexdigest()}{_extension(file.content_type)}"
+        await asyncio.to_thread(_store, temp_path, directory / filename)
+        return filename
+    except BaseException:
+        await asyncio.to_thread(_remove, temp_path)
+        raise
+
+def referenced_uploads(db: Session) -> set[str]:
+    """File names used by IMAGE and RECEIPT messages (content holds the URL)."""
+    names = set()
+    rows = db.query(Message.content)\
+        .filter(Message.msg_type.in_([MessageType.IMAGE, MessageType.RECEIPT]))\
+        .yield_per(5000)
+    for (content,) in rows:
+        names.add(pathlib.PurePosixPath(urlparse(content.strip()).path).name)
+    return names
+
+def collect_garbage(db: Session, grace_seconds: int, dry_run: bool = False) -> dict:
+    """
+    Removes uploads that no chat message references.
+    Files younger than grace_seconds are kept: they may be uploaded
+    but not sent yet. Leftover temp files are removed the same way.
+    """
+    ensure_upload_dirs()
+    referenced = referenced_uploads(db)
+    # Thumbnails/previews are "<original stem>_<variant>.jpg" in the variants subfolder
+    referenced_stems = {pathlib.PurePosixPath(name).stem for name in referenced}
+    cutoff = time.time() - grace_seconds
+    removed, freed = [], 0
+
+    variants = upload_dir() / "variants"
+    files = list(upload_dir().iterdir()) + (list(variants.iterdir()) if variants.is_dir() else [])
+    for path in files:
+        if not path.is_file():
+            continue
+        if path.parent == variants:
+            if path.name.rsplit("_", 1)[0] in referenced_stems:
+                continue
+        elif path.name in referenced:
+            continue
+        stat = path.stat()
+        if stat.st_mtime > cutoff:
+            continue
+        if not dry_run:
+            _remove(str(path))
+        removed.append(str(path.relative_to(upload_dir())))
+        freed += stat.st_size
+
+    return {"removed": removed, "freed_bytes": freed}
@@ -0,0 +1,83 @@
+import asyncio
+from typing import List, Tuple
+
+from core.config import settings
+from db_config import SessionLocal
+from . import service
+from .models import Message
+from .schemas import MessageCreate
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages.
+    WebSocket handlers await `save()`; a single background task collects what
+    arrived within CHAT_WRITE_WINDOW_MS (up to CHAT_WRITE_BATCH_SIZE messages)
+    and stores it with one INSERT in a worker thread, so the event loop never
+    runs blocking database calls.
+    """
+
+    def __init__(self, batch_size: int, window_seconds: float):
+        self.batch_size = batch_size
+        self.window_seconds = window_seconds
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+
+    def _ensure_started(self):
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._run())
+
+    async def save(self, message_data: MessageCreate, sender_id: int) -> Message:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((message_data, sender_id, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[MessageCreate, int, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.window_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                messages = await asyncio.to_thread(self._store, [(data, sender_id) for data, sender_id, _ in batch])
+                for (_, _, future), message in zip(batch, messages):
+                    if not future.done():
+                        future.set_result(message)
+            except Exception:
+                # One bad row (e.g. unknown recipient) must not lose the others
+                for data, sender_id, future in batch:
+                    try:
+                        message = await asyncio.to_thread(self._store, [(data, sender_id)])
+                        if not future.done():
+                            future.set_result(message[0])
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+
+    @staticmethod
+    def _store(items: List[Tuple[MessageCreate, int]]) -> List[Message]:
+        # Runs in a worker thread with its own short-lived session
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            return service.create_messages(db, items)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+message_writer = MessageWriter(
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    window_seconds=settings.CHAT_WRITE_WINDOW_MS / 1000
+)
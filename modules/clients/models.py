@@ -1,4 +1,4 @@
-from sqlalchemy import String, Float, DateTime, func, ForeignKey, Numeric, Boolean
+from sqlalchemy import String, Float, DateTime, func, ForeignKey, Numeric, Boolean, Integer, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db_config import Base
 
@@ -8,12 +8,31 @@ class Client(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     full_name: Mapped[str] = mapped_column(String, index=True, nullable=False)
     phone: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    phone_digits: Mapped[str | None] = mapped_column(String, nullable=True) # Только цифры телефона, для поиска
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     total_debt: Mapped[float] = mapped_column(Numeric(10, 2), default=0.0)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    # Denormalized lifetime metrics, maintained by create_sale / create_refund / add_payment
+    # (rebuild from scratch with `python manage.py rebuild-client-metrics`)
+    lifetime_revenue: Mapped[float] = mapped_column(Numeric(12, 2), default=0, server_default="0", nullable=False, index=True)
+    sales_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False, index=True)
+    last_sale_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    last_payment_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
     
     payments: Mapped[list["Payment"]] = relationship(back_populates="client")
 
+    __table_args__ = (
+        # text_pattern_ops lets LIKE 'prefix%' use the b-tree whatever the DB collation is
+        Index("ix_clients_phone_digits_prefix", "phone_digits", postgresql_ops={"phone_digits": "text_pattern_ops"}),
+        # Last digits typed at the till become a prefix search over the reversed number
+        Index("ix_clients_phone_digits_suffix", text("reverse(phone_digits) text_pattern_ops")),
+        # "Most recent first, clients without activity last": Postgres sorts NULLs first for DESC,
+        # so DESC NULLS LAST cannot use the plain column indexes
+        Index("ix_clients_last_sale_at_desc", text("last_sale_at DESC NULLS LAST"), "id"),
+        Index("ix_clients_last_payment_at_desc", text("last_payment_at DESC NULLS LAST"), "id"),
+    )
+
 class Payment(Base):
     __tablename__ = "payments"
 
@@ -26,3 +45,7 @@ class Payment(Base):
 
     client: Mapped["Client"] = relationship(back_populates="payments")
     performed_by = relationship("modules.auth.models.User")
+
+    __table_args__ = (
+        Index("ix_payments_client_id_created_at", "client_id", "created_at"),
+    )
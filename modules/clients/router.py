@@ -1,5 +1,7 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from db_config import get_db
@@ -14,7 +16,12 @@ from .schemas import (
     ClientUpdate,
     PaymentCreate, 
     PaymentRead,
-    ClientHistoryItem
+    PaymentBatchCreate,
+    PaymentBatchReport,
+    ClientHistoryPage,
+    StatementFormat,
+    ClientSortField,
+    SortOrder
 )
 
 router = APIRouter()
@@ -32,10 +39,35 @@ def read_clients(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    sort_by: Optional[ClientSortField] = None,
+    order: SortOrder = SortOrder.desc,
+    min_lifetime_revenue: Optional[float] = None,
+    min_sales_count: Optional[int] = None,
+    last_sale_after: Optional[datetime] = None,
+    last_sale_before: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
-    return service.get_clients(db=db, skip=skip, limit=limit, search=search)
+    return service.get_clients(
+        db=db,
+        skip=skip,
+        limit=limit,
+        search=search,
+        sort_by=sort_by,
+        order=order,
+        min_lifetime_revenue=min_lifetime_revenue,
+        min_sales_count=min_sales_count,
+        last_sale_after=last_sale_after,
+        last_sale_before=last_sale_before
+    )
+
+@router.get("/clients/lookup", response_model=List[ClientRead])
+def lookup_clients(
+    phone: str = Query(..., min_length=2, description="First or last digits of the phone number"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_manager)
+):
+    return service.lookup_clients_by_phone(db=db, digits=phone)
 
 @router.get("/clients/{client_id}", response_model=ClientRead)
 def read_client(
@@ -56,14 +88,56 @@ def create_payment(
 ):
     return service.add_payment(db=db, payment=payment, user=current_user)
 
-@router.get("/clients/{client_id}/history", response_model=List[ClientHistoryItem])
+@router.post("/payments/batch", response_model=PaymentBatchReport)
+def create_payments_batch(
+    batch: PaymentBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_manager)
+):
+    """
+    Пакетный ввод оплат (сверка с банковской выпиской).
+    Строка может ссылаться на клиента по client_id или по телефону.
+    """
+    return service.add_payments_batch(db=db, batch=batch, user=current_user)
+
+@router.get("/clients/{client_id}/history", response_model=ClientHistoryPage)
 def get_client_history(
     client_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
-    return service.get_client_history(db=db, client_id=client_id)
-    return service.get_client_history(db=db, client_id=client_id)
+    return service.get_client_history(
+        db=db, client_id=client_id, cursor=cursor, limit=limit, date_from=date_from, date_to=date_to
+    )
+
+@router.get("/clients/{client_id}/statement")
+def get_client_statement(
+    client_id: int,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    format: StatementFormat = StatementFormat.csv,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_manager)
+):
+    """
+    Выписка клиента: продажи, оплаты и возвраты с остатком долга после каждой операции.
+    """
+    client = db.query(Client.id).filter(Client.id == client_id).first()
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+
+    stream = service.iter_client_statement(client_id, date_from=date_from, date_to=date_to, fmt=format)
+    if format == StatementFormat.json:
+        return StreamingResponse(stream, media_type="application/json")
+    return StreamingResponse(
+        stream,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="statement_{client_id}.csv"'}
+    )
 
 @router.put("/clients/{client_id}", response_model=ClientRead)
 def update_client(
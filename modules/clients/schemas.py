@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from decimal import Decimal
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 from enum import Enum
@@ -8,6 +8,24 @@ from enum import Enum
 class TransactionType(str, Enum):
     sale = "sale"
     payment = "payment"
+    refund = "refund"
+
+class ClientSortField(str, Enum):
+    full_name = "full_name"
+    created_at = "created_at"
+    total_debt = "total_debt"
+    lifetime_revenue = "lifetime_revenue"
+    sales_count = "sales_count"
+    last_sale_at = "last_sale_at"
+    last_payment_at = "last_payment_at"
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+class StatementFormat(str, Enum):
+    csv = "csv"
+    json = "json"
 
 class ClientBase(BaseModel):
     full_name: str
@@ -25,6 +43,10 @@ class ClientRead(ClientBase):
     total_debt: Decimal
     is_active: bool
     created_at: datetime
+    lifetime_revenue: Decimal = Decimal(0)
+    sales_count: int = 0
+    last_sale_at: Optional[datetime] = None
+    last_payment_at: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
 
@@ -33,6 +55,26 @@ class PaymentCreate(BaseModel):
     amount: Decimal
     description: Optional[str] = None
 
+class PaymentBatchRow(BaseModel):
+    # Either client_id or phone (any format, matched by digits)
+    client_id: Optional[int] = None
+    phone: Optional[str] = None
+    amount: Decimal
+    description: Optional[str] = None
+
+class PaymentBatchCreate(BaseModel):
+    items: List[PaymentBatchRow]
+
+class PaymentBatchResult(BaseModel):
+    row: int # Номер платежа в запросе, начиная с 1
+    client_id: Optional[int] = None
+    payment_id: Optional[int] = None
+    error: Optional[str] = None
+
+class PaymentBatchReport(BaseModel):
+    created: int
+    results: List[PaymentBatchResult]
+
 class PaymentRead(BaseModel):
     id: int
     client_id: int
@@ -49,3 +91,7 @@ class ClientHistoryItem(BaseModel):
     amount: Decimal
     date: datetime
     description: Optional[str] = None
+
+class ClientHistoryPage(BaseModel):
+    items: List[ClientHistoryItem]
+    next_cursor: Optional[str] = None
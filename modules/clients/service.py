@@ -1,11 +1,24 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, select, union_all, literal, func, cast, String, tuple_, update, insert, values, column, Integer, Numeric
 from fastapi import HTTPException
-from typing import List, Optional
+import csv
+import io
+import json
+from itertools import chain
+from typing import List, Optional, Iterator
+from datetime import datetime
 from .models import Client, Payment
-from .schemas import ClientCreate, PaymentCreate, ClientHistoryItem, TransactionType, ClientUpdate
-from modules.sales.models import Sale
+from .schemas import ClientCreate, PaymentCreate, PaymentBatchCreate, PaymentBatchResult, ClientHistoryItem, TransactionType, ClientUpdate, StatementFormat, ClientSortField, SortOrder
+from modules.sales.models import Sale, Refund
+from db_config import SessionLocal
 from modules.auth.models import User
+from core.pagination import encode_cursor, decode_cursor, cursor_datetime
+
+LOOKUP_LIMIT = 20
+
+def normalize_phone(phone: str) -> str:
+    """'+992 (90) 123-45-67' -> '992901234567'"""
+    return "".join(ch for ch in phone if ch.isdigit())
 
 def create_client(db: Session, client: ClientCreate) -> Client:
     # Check for existing phone
@@ -13,13 +26,26 @@ def create_client(db: Session, client: ClientCreate) -> Client:
     if db_client:
         raise HTTPException(status_code=400, detail="Client with this phone already exists")
         
-    db_client = Client(**client.model_dump())
+    db_client = Client(**client.model_dump(), phone_digits=normalize_phone(client.phone))
     db.add(db_client)
     db.commit()
     db.refresh(db_client)
     return db_client
 
-def get_clients(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[Client]:
+NULLABLE_SORT_FIELDS = (ClientSortField.last_sale_at, ClientSortField.last_payment_at)
+
+def get_clients(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    search: Optional[str] = None,
+    sort_by: Optional[ClientSortField] = None,
+    order: SortOrder = SortOrder.desc,
+    min_lifetime_revenue: Optional[float] = None,
+    min_sales_count: Optional[int] = None,
+    last_sale_after: Optional[datetime] = None,
+    last_sale_before: Optional[datetime] = None
+) -> List[Client]:
     query = db.query(Client).filter(Client.is_active == True)
     
     if search:
@@ -29,9 +55,46 @@ def get_clients(db: Session, skip: int = 0, limit: int = 100, search: Optional[s
                 Client.phone.ilike(f"%{search}%")
             )
         )
+
+    # Filters on the denormalized metrics are plain indexed column comparisons
+    if min_lifetime_revenue is not None:
+        query = query.filter(Client.lifetime_revenue >= min_lifetime_revenue)
+    if min_sales_count is not None:
+        query = query.filter(Client.sales_count >= min_sales_count)
+    if last_sale_after:
+        query = query.filter(Client.last_sale_at >= last_sale_after)
+    if last_sale_before:
+        query = query.filter(Client.last_sale_at <= last_sale_before)
+
+    if sort_by:
+        column = getattr(Client, sort_by.value)
+        ordered = column.desc() if order == SortOrder.desc else column.asc()
+        # Clients without a sale/payment go last. Only the nullable columns get
+        # NULLS LAST: plain DESC on the others is a backward scan of their index,
+        # and DESC NULLS LAST has its own indexes (ix_clients_*_desc)
+        if sort_by in NULLABLE_SORT_FIELDS:
+            ordered = ordered.nulls_last()
+        query = query.order_by(ordered, Client.id)
     
     return query.offset(skip).limit(limit).all()
 
+def lookup_clients_by_phone(db: Session, digits: str) -> List[Client]:
+    """
+    Till lookup by the beginning or the end of a phone number.
+    Both predicates are index range scans (see Client.__table_args__).
+    """
+    digits = normalize_phone(digits)
+    if not digits:
+        raise HTTPException(status_code=400, detail="Phone digits are required")
+
+    return db.query(Client).filter(
+        Client.is_active == True,
+        or_(
+            Client.phone_digits.like(f"{digits}%"),
+            func.reverse(Client.phone_digits).like(f"{digits[::-1]}%")
+        )
+    ).order_by(Client.full_name).limit(LOOKUP_LIMIT).all()
+
 def add_payment(db: Session, payment: PaymentCreate, user: User) -> Payment:
     """
     Adds a payment and reduces client debt atomically.
@@ -54,49 +117,332 @@ def add_payment(db: Session, payment: PaymentCreate, user: User) -> Payment:
         client.total_debt = 0
     else:
         client.total_debt -= payment.amount
+    client.last_payment_at = func.now()
     
     db.add(db_payment)
     db.commit()
     db.refresh(db_payment)
     return db_payment
 
-def get_client_history(db: Session, client_id: int) -> List[ClientHistoryItem]:
+def _history_branch(model, type_: TransactionType, amount, description, client_id: int,
+                    date_from: Optional[datetime], date_to: Optional[datetime],
+                    position: Optional[dict], limit: int):
+    """
+    One side of the history UNION ALL, already ordered and limited,
+    so Postgres reads at most `limit` rows from the (client_id, created_at) index.
+    """
+    query = select(
+        model.id.label("id"),
+        literal(type_.value).label("type"),
+        amount.label("amount"),
+        model.created_at.label("date"),
+        description.label("description")
+    ).where(model.client_id == client_id)
+
+    if date_from:
+        query = query.where(model.created_at >= date_from)
+    if date_to:
+        query = query.where(model.created_at <= date_to)
+
+    if position:
+        # Keyset on (date, type, id) descending; type is constant within a branch
+        cursor_date = cursor_datetime(position, "date")
+        if type_.value < position["type"]:
+            query = query.where(model.created_at <= cursor_date)
+        elif type_.value == position["type"]:
+            query = query.where(tuple_(model.created_at, model.id) < tuple_(cursor_date, int(position["id"])))
+        else:
+            query = query.where(model.created_at < cursor_date)
+
+    return select(
+        query.order_by(model.created_at.desc(), model.id.desc()).limit(limit).subquery()
+    )
+
+def _resolve_batch_clients(db: Session, batch: PaymentBatchCreate) -> dict:
+    """
+    Maps normalized phone digits of the batch to active client ids in one query.
+    Digits shared by several clients map to None (ambiguous).
+    """
+    digits = {normalize_phone(row.phone) for row in batch.items if row.client_id is None and row.phone}
+    digits.discard("")
+    if not digits:
+        return {}
+
+    by_phone = {}
+    for client_id, phone_digits in db.query(Client.id, Client.phone_digits)\
+            .filter(Client.is_active == True, Client.phone_digits.in_(digits)).all():
+        by_phone[phone_digits] = None if phone_digits in by_phone else client_id
+    return by_phone
+
+def add_payments_batch(db: Session, batch: PaymentBatchCreate, user: User) -> dict:
+    """
+    Bulk version of add_payment for bank statement imports.
+    - All affected clients are locked in one statement, in id order (no deadlocks
+      with concurrent sales, which also lock a single client row).
+    - Payments are inserted with one multi-row INSERT.
+    - Debts are reduced with one UPDATE ... FROM (VALUES ...).
+    Invalid rows are reported and skipped; the valid ones are applied together.
+    """
+    # Rows are numbered from 1, like the product import report
+    results = [PaymentBatchResult(row=i + 1) for i in range(len(batch.items))]
+    by_phone = _resolve_batch_clients(db, batch)
+
+    for result, row in zip(results, batch.items):
+        if row.amount <= 0:
+            result.error = "Amount must be positive"
+        elif row.client_id is not None:
+            result.client_id = row.client_id
+        elif row.phone:
+            digits = normalize_phone(row.phone)
+            if digits not in by_phone:
+                result.error = "Client with this phone not found"
+            elif by_phone[digits] is None:
+                result.error = "Several clients match this phone"
+            else:
+                result.client_id = by_phone[digits]
+        else:
+            result.error = "client_id or phone is required"
+
+    client_ids = sorted({r.client_id for r in results if r.error is None})
+    locked = {
+        c.id for c in db.query(Client.id)
+        .filter(Client.id.in_(client_ids))
+        .order_by(Client.id)
+        .with_for_update()
+        .all()
+    } if client_ids else set()
+
+    valid = []
+    for result, row in zip(results, batch.items):
+        if result.error is None and result.client_id not in locked:
+            result.error = "Client not found"
+        if result.error is None:
+            valid.append((result, row))
+
+    if valid:
+        payment_ids = db.execute(
+            insert(Payment).returning(Payment.id, sort_by_parameter_order=True),
+            [
+                {
+                    "client_id": result.client_id,
+                    "amount": row.amount,
+                    "description": row.description,
+                    "performed_by_id": user.id
+                }
+                for result, row in valid
+            ]
+        ).scalars().all()
+        for (result, _), payment_id in zip(valid, payment_ids):
+            result.payment_id = payment_id
+
+        totals = {}
+        for result, row in valid:
+            totals[result.client_id] = totals.get(result.client_id, 0) + row.amount
+
+        # Debt never goes below zero, same as add_payment
+        paid = values(column("client_id", Integer), column("amount", Numeric), name="paid")\
+            .data(list(totals.items()))
+        db.execute(
+            update(Client)
+            .where(Client.id == paid.c.client_id)
+            .values(
+                total_debt=func.greatest(Client.total_debt - paid.c.amount, 0),
+                last_payment_at=func.now()
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    db.commit()
+    return {"created": len(valid), "results": results}
+
+def get_client_history(
+    db: Session,
+    client_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> dict:
+    """
+    Sales and payments of a client, newest first, merged in SQL with UNION ALL.
+    Only the requested page is fetched and turned into ClientHistoryItem.
+    """
     # Check if client exists
-    client = db.query(Client).filter(Client.id == client_id).first()
+    client = db.query(Client.id).filter(Client.id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
 
-    # Step A: Get Payments
-    payments = db.query(Payment).filter(Payment.client_id == client_id).all()
-    history_items = []
-    
-    for payment in payments:
-        history_items.append(ClientHistoryItem(
-            id=payment.id,
-            type=TransactionType.payment,
-            amount=payment.amount,
-            date=payment.created_at,
-            description=payment.description or "Payment"
-        ))
-
-    # Step B: Get Sales
-    sales = db.query(Sale).filter(Sale.client_id == client_id).all()
-    
-    for sale in sales:
-        history_items.append(ClientHistoryItem(
-            id=sale.id,
-            type=TransactionType.sale,
-            amount=sale.total_amount,
-            date=sale.created_at,
-            description=f"Sale #{sale.id}"
-        ))
-
-    # Step C & D: Sort by date descending
-    history_items.sort(key=lambda x: x.date, reverse=True)
-    
-    history_items.sort(key=lambda x: x.date, reverse=True)
-    
-    return history_items
+    position = decode_cursor(cursor)
+    if position and not ({"date", "type", "id"} <= position.keys()):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    payments = _history_branch(
+        Payment, TransactionType.payment, Payment.amount,
+        func.coalesce(Payment.description, "Payment"),
+        client_id, date_from, date_to, position, limit
+    )
+    sales = _history_branch(
+        Sale, TransactionType.sale, Sale.total_amount,
+        literal("Sale #") + cast(Sale.id, String),
+        client_id, date_from, date_to, position, limit
+    )
+
+    history = union_all(payments, sales).subquery()
+    rows = db.execute(
+        select(history)
+        .order_by(history.c.date.desc(), history.c.type.desc(), history.c.id.desc())
+        .limit(limit)
+    ).all()
+
+    items = [
+        ClientHistoryItem(
+            id=row.id,
+            type=TransactionType(row.type),
+            amount=row.amount,
+            date=row.date,
+            description=row.description
+        )
+        for row in rows
+    ]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor({"date": last.date, "type": last.type, "id": last.id})
+
+    return {"items": items, "next_cursor": next_cursor}
+
+STATEMENT_BATCH_SIZE = 1000
+STATEMENT_COLUMNS = ["date", "type", "id", "description", "amount", "debt_change", "balance"]
+
+def _statement_query(client_id: int, date_from: Optional[datetime], date_to: Optional[datetime]):
+    """
+    Sales, payments and refunds of a client with the running debt balance.
+    The window sum runs over the whole history up to date_to, so rows before
+    date_from only contribute to the opening balance and are filtered out after.
+    """
+    sales = select(
+        Sale.created_at.label("date"),
+        literal(TransactionType.sale.value).label("type"),
+        Sale.id.label("id"),
+        (literal("Sale #") + cast(Sale.id, String)).label("description"),
+        Sale.total_amount.label("amount"),
+        (Sale.total_amount - Sale.paid_amount).label("debt_change")
+    ).where(Sale.client_id == client_id)
+
+    payments = select(
+        Payment.created_at,
+        literal(TransactionType.payment.value),
+        Payment.id,
+        func.coalesce(Payment.description, "Payment"),
+        Payment.amount,
+        -Payment.amount
+    ).where(Payment.client_id == client_id)
+
+    refunds = select(
+        Refund.created_at,
+        literal(TransactionType.refund.value),
+        Refund.id,
+        literal("Refund for Sale #") + cast(Refund.sale_id, String),
+        Refund.total_refund_amount,
+        -Refund.total_refund_amount
+    ).join(Sale, Sale.id == Refund.sale_id).where(Sale.client_id == client_id)
+
+    if date_to:
+        sales = sales.where(Sale.created_at <= date_to)
+        payments = payments.where(Payment.created_at <= date_to)
+        refunds = refunds.where(Refund.created_at <= date_to)
+
+    events = union_all(sales, payments, refunds).subquery()
+    chronological = (events.c.date, events.c.type, events.c.id)
+    ledger = select(
+        events,
+        func.sum(events.c.debt_change).over(order_by=chronological).label("balance")
+    ).subquery()
+
+    query = select(ledger).order_by(ledger.c.date, ledger.c.type, ledger.c.id)
+    if date_from:
+        query = query.where(ledger.c.date >= date_from)
+    return query
+
+def _opening_balance_before(db: Session, client_id: int, date_from: Optional[datetime]):
+    # Only needed when the period itself has no rows to derive the opening from
+    if not date_from:
+        return 0
+    query = _statement_query(client_id, None, date_from).subquery()
+    last = db.execute(
+        select(query.c.balance, query.c.date).where(query.c.date < date_from)
+        .order_by(query.c.date.desc(), query.c.type.desc(), query.c.id.desc()).limit(1)
+    ).first()
+    return last.balance if last else 0
+
+def iter_client_statement(
+    client_id: int,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    fmt: StatementFormat = StatementFormat.csv
+) -> Iterator[str]:
+    """
+    Streams a client statement as CSV or JSON chunks.
+    - Rows come from a server-side cursor in batches, so memory stays flat.
+    - Balances are the plain running sum of debt changes: unlike total_debt,
+      which is clamped at zero, an overpayment shows up as a negative balance.
+    Opens its own session: the response outlives the request dependencies.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _statement_query(client_id, date_from, date_to).execution_options(yield_per=STATEMENT_BATCH_SIZE)
+        )
+        rows = iter(result)
+        first = next(rows, None)
+
+        if first is not None:
+            opening = first.balance - first.debt_change
+        else:
+            opening = _opening_balance_before(db, client_id, date_from)
+        closing = opening
+
+        def row_values(row):
+            return [row.date.isoformat(), row.type, row.id, row.description, row.amount, row.debt_change, row.balance]
+
+        if fmt == StatementFormat.json:
+            yield json.dumps({
+                "client_id": client_id,
+                "date_from": date_from.isoformat() if date_from else None,
+                "date_to": date_to.isoformat() if date_to else None,
+                "opening_balance": str(opening)
+            })[:-1] + ', "items": ['
+            separator = ""
+            if first is not None:
+                for row in chain([first], rows):
+                    yield separator + json.dumps(dict(zip(STATEMENT_COLUMNS, row_values(row))), default=str)
+                    separator = ","
+                    closing = row.balance
+            yield f'], "closing_balance": "{closing}"}}'
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+            def flush():
+                data = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+                return data
+
+            writer.writerow(["opening_balance", "", "", "", "", "", opening])
+            writer.writerow(STATEMENT_COLUMNS)
+            yield flush()
+            if first is not None:
+                for count, row in enumerate(chain([first], rows), start=1):
+                    writer.writerow(row_values(row))
+                    closing = row.balance
+                    if count % STATEMENT_BATCH_SIZE == 0:
+                        yield flush()
+            writer.writerow(["closing_balance", "", "", "", "", "", closing])
+            yield flush()
+    finally:
+        db.close()
 
 def update_client(db: Session, client_id: int, data: ClientUpdate) -> Client:
     client = db.query(Client).filter(Client.id == client_id).first()
@@ -112,12 +458,35 @@ def update_client(db: Session, client_id: int, data: ClientUpdate) -> Client:
         client.full_name = data.full_name
     if data.phone:
         client.phone = data.phone
+        client.phone_digits = normalize_phone(data.phone)
 
     db.add(client)
     db.commit()
     db.refresh(client)
     return client
 
+def rebuild_client_metrics(db: Session) -> int:
+    """
+    Recomputes lifetime metrics of every client from sales, refunds and payments
+    in a single set-based UPDATE. Returns the number of updated clients.
+    """
+    sales_total = select(func.coalesce(func.sum(Sale.total_amount), 0))\
+        .where(Sale.client_id == Client.id).scalar_subquery()
+    refunds_total = select(func.coalesce(func.sum(Refund.total_refund_amount), 0))\
+        .join(Sale, Sale.id == Refund.sale_id)\
+        .where(Sale.client_id == Client.id).scalar_subquery()
+
+    result = db.execute(
+        update(Client).values(
+            lifetime_revenue=sales_total - refunds_total,
+            sales_count=select(func.count(Sale.id)).where(Sale.client_id == Client.id).scalar_subquery(),
+            last_sale_at=select(func.max(Sale.created_at)).where(Sale.client_id == Client.id).scalar_subquery(),
+            last_payment_at=select(func.max(Payment.created_at)).where(Payment.client_id == Client.id).scalar_subquery()
+        ).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
 def delete_client(db: Session, client_id: int):
     client = db.query(Client).filter(Client.id == client_id).first()
     if not client:
@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import String, DateTime, func, ForeignKey, Numeric, Enum as SAEnum, Integer
+from sqlalchemy import String, DateTime, func, ForeignKey, Numeric, Enum as SAEnum, Integer, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db_config import Base
 
@@ -22,3 +22,8 @@ class Expense(Base):
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     created_by = relationship("modules.auth.models.User")
+
+    __table_args__ = (
+        Index("ix_expenses_created_at_id", "created_at", "id"),
+        Index("ix_expenses_category_created_at", "category", "created_at"),
+    )
@@ -7,7 +7,8 @@ from db_config import get_db
 from modules.auth.dependencies import require_manager, require_admin
 from modules.auth.models import User
 from . import service
-from .schemas import ExpenseCreate, ExpenseRead, ExpenseUpdate
+from .models import ExpenseCategory
+from .schemas import ExpenseCreate, ExpenseRead, ExpenseUpdate, ExpensePage, ExpenseSummaryItem
 
 router = APIRouter(tags=["Expenses"])
 
@@ -19,15 +20,47 @@ def create_expense(
 ):
     return service.create_expense(db=db, expense_data=expense, user=current_user)
 
-@router.get("/", response_model=List[ExpenseRead])
+@router.get("/", response_model=ExpensePage)
 def read_expenses(
     period: str = "all",
     month: int = None,
     year: int = None,
+    category: Optional[ExpenseCategory] = None,
+    created_by_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
-    return service.get_expenses(db=db, period=period, month=month, year=year)
+    return service.get_expenses(
+        db=db,
+        period=period,
+        month=month,
+        year=year,
+        category=category,
+        created_by_id=created_by_id,
+        cursor=cursor,
+        limit=limit
+    )
+
+@router.get("/summary", response_model=List[ExpenseSummaryItem])
+def read_expense_summary(
+    period: str = "all",
+    month: int = None,
+    year: int = None,
+    category: Optional[ExpenseCategory] = None,
+    created_by_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_manager)
+):
+    return service.get_expense_summary(
+        db=db,
+        period=period,
+        month=month,
+        year=year,
+        category=category,
+        created_by_id=created_by_id
+    )
 
 @router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_expense(
@@ -23,3 +23,13 @@ class ExpenseRead(BaseModel):
     created_by_id: int
     
     model_config = ConfigDict(from_attributes=True)
+
+class ExpensePage(BaseModel):
+    items: List[ExpenseRead]
+    next_cursor: Optional[str] = None
+
+class ExpenseSummaryItem(BaseModel):
+    month: datetime # Первое число месяца
+    category: ExpenseCategory
+    total: Decimal
+    count: int
@@ -1,13 +1,15 @@
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, func, tuple_
 from typing import List, Optional
 from datetime import datetime, date, time
 
-from .models import Expense
+from .models import Expense, ExpenseCategory
 from .schemas import ExpenseCreate, ExpenseUpdate
 from modules.auth.models import User
 
 from core.utils import get_date_range
+from core.pagination import encode_cursor, decode_cursor, cursor_datetime
 
 def create_expense(db: Session, expense_data: ExpenseCreate, user: User) -> Expense:
     db_expense = Expense(
@@ -21,16 +23,81 @@ def create_expense(db: Session, expense_data: ExpenseCreate, user: User) -> Expe
     db.refresh(db_expense)
     return db_expense
 
+def _filtered_expenses(
+    db: Session,
+    period: str,
+    month: Optional[int],
+    year: Optional[int],
+    category: Optional[ExpenseCategory],
+    created_by_id: Optional[int]
+):
+    start_date, end_date = get_date_range(period, month, year)
+
+    query = db.query(Expense).filter(and_(Expense.created_at >= start_date, Expense.created_at <= end_date))
+    if category:
+        query = query.filter(Expense.category == category)
+    if created_by_id:
+        query = query.filter(Expense.created_by_id == created_by_id)
+    return query
+
 def get_expenses(
     db: Session, 
     period: str = "all", 
     month: Optional[int] = None, 
-    year: Optional[int] = None
-) -> List[Expense]:
-    start_date, end_date = get_date_range(period, month, year)
-    
-    query = db.query(Expense).filter(and_(Expense.created_at >= start_date, Expense.created_at <= end_date))
-    return query.order_by(Expense.created_at.desc()).all()
+    year: Optional[int] = None,
+    category: Optional[ExpenseCategory] = None,
+    created_by_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> dict:
+    query = _filtered_expenses(db, period, month, year, category, created_by_id)
+
+    position = decode_cursor(cursor)
+    if position:
+        try:
+            last_id = int(position["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            tuple_(Expense.created_at, Expense.id) < tuple_(cursor_datetime(position), last_id)
+        )
+
+    expenses = query.order_by(Expense.created_at.desc(), Expense.id.desc()).limit(limit).all()
+
+    next_cursor = None
+    if len(expenses) == limit:
+        last = expenses[-1]
+        next_cursor = encode_cursor({"created_at": last.created_at, "id": last.id})
+
+    return {"items": expenses, "next_cursor": next_cursor}
+
+def get_expense_summary(
+    db: Session,
+    period: str = "all",
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    category: Optional[ExpenseCategory] = None,
+    created_by_id: Optional[int] = None
+) -> List[dict]:
+    """
+    Totals per category per month, computed by the database in one GROUP BY.
+    """
+    month_start = func.date_trunc("month", Expense.created_at).label("month")
+    rows = _filtered_expenses(db, period, month, year, category, created_by_id)\
+        .with_entities(
+            month_start,
+            Expense.category,
+            func.sum(Expense.amount).label("total"),
+            func.count(Expense.id).label("count")
+        )\
+        .group_by(month_start, Expense.category)\
+        .order_by(month_start.desc(), Expense.category)\
+        .all()
+
+    return [
+        {"month": r.month, "category": r.category, "total": r.total, "count": r.count}
+        for r in rows
+    ]
 
 def delete_expense(db: Session, expense_id: int) -> bool:
     expense = db.query(Expense).filter(Expense.id == expense_id).first()
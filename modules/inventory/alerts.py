@@ -0,0 +1,30 @@
+from typing import Optional
+from .models import Product
+from modules.chat.manager import manager
+
+def stock_threshold_alert(product: Product, previous_quantity: float) -> Optional[dict]:
+    """
+    Returns an alert payload if the product crossed its min_stock_level
+    (in either direction) since previous_quantity, otherwise None.
+    """
+    if product.min_stock_level is None:
+        return None
+
+    was_low = previous_quantity < product.min_stock_level
+    is_low = product.quantity < product.min_stock_level
+    if was_low == is_low:
+        return None
+
+    return {
+        "event": "low_stock" if is_low else "stock_restored",
+        "product_id": product.id,
+        "name": product.name,
+        "unit": product.unit,
+        "quantity": float(product.quantity),
+        "min_stock_level": float(product.min_stock_level),
+    }
+
+async def push_stock_alerts(alerts: list[dict]):
+    # Delivered to everyone online through the chat WebSocket
+    for alert in alerts:
+        await manager.broadcast(alert)
@@ -0,0 +1,97 @@
+import threading
+import time
+from typing import Dict, List
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from .models import Product
+from .schemas import ProductScanRead
+
+# Fields served from the cache. Quantity is deliberately not one of them:
+# it changes on every sale and would keep the map reloading.
+CACHED_FIELDS = ("name", "unit", "items_per_pack", "sku", "barcode", "recommended_price")
+
+class ProductCodeCache:
+    """
+    In-memory map SKU/barcode -> product for scanner-driven tills.
+    Loaded with one query over the whole catalog, then every lookup is a dict access.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._codes: Dict[str, ProductScanRead] = {}
+        self._loaded_at: float | None = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def _ensure_loaded(self, db: Session):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            generation = self._generation
+            rows = db.query(Product.id, *(getattr(Product, f) for f in CACHED_FIELDS))\
+                .filter(or_(Product.sku.isnot(None), Product.barcode.isnot(None)))\
+                .all()
+
+            codes = {}
+            for row in rows:
+                item = ProductScanRead.model_validate(row)
+                if item.sku:
+                    codes[item.sku] = item
+                # Barcode wins if a code is both someone's SKU and someone's barcode
+                if item.barcode:
+                    codes[item.barcode] = item
+
+            self._codes = codes
+            # A change that happened during the load keeps the cache stale
+            if generation == self._generation:
+                self._loaded_at = time.monotonic()
+
+    def lookup(self, db: Session, codes: List[str]) -> dict:
+        self._ensure_loaded(db)
+        found = {}
+        missing = []
+        for code in codes:
+            item = self._codes.get(code.strip())
+            if item:
+                found[code] = item
+            else:
+                missing.append(code)
+        return {"found": found, "missing": missing}
+
+product_codes = ProductCodeCache(ttl_seconds=settings.PRODUCT_CODE_CACHE_TTL)
+
+# Invalidation waits for the commit: dropping the map at flush time would let
+# another request reload the pre-commit catalog and keep it as fresh.
+_DIRTY_KEY = "product_codes_dirty"
+
+@event.listens_for(Session, "before_flush")
+def _collect_catalog_changes(session, flush_context, instances):
+    changed = any(isinstance(obj, Product) for obj in session.new) \
+        or any(isinstance(obj, Product) for obj in session.deleted) \
+        or any(
+            isinstance(obj, Product)
+            and any(inspect(obj).attrs[f].history.has_changes() for f in CACHED_FIELDS)
+            for obj in session.dirty
+        )
+    if changed:
+        session.info[_DIRTY_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        product_codes.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_changes(session):
+    session.info.pop(_DIRTY_KEY, None)
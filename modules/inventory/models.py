@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import String, Float, Enum as SAEnum, DateTime, func, ForeignKey, Numeric, Integer
+from sqlalchemy import String, Float, Enum as SAEnum, DateTime, Date, func, ForeignKey, Numeric, Integer, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db_config import Base
 
@@ -13,6 +13,8 @@ class Product(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, index=True, nullable=False)
+    sku: Mapped[str | None] = mapped_column(String, unique=True, index=True, nullable=True)
+    barcode: Mapped[str | None] = mapped_column(String, unique=True, index=True, nullable=True)
     description: Mapped[str | None] = mapped_column(String, nullable=True)
     unit: Mapped[str] = mapped_column(String, nullable=False)  # kg, pcs, etc.
     items_per_pack: Mapped[int] = mapped_column(Integer, default=1, nullable=False) # How many items in 1 pack
@@ -23,16 +25,47 @@ class Product(Base):
     
     movements: Mapped[list["StockMovement"]] = relationship(back_populates="product")
 
+    __table_args__ = (
+        # Partial index: only products below their threshold are indexed,
+        # so the low-stock listing stays tiny no matter how large the catalog is
+        Index("ix_products_low_stock", "name", postgresql_where=text("quantity < min_stock_level")),
+    )
+
 class StockMovement(Base):
     __tablename__ = "stock_movements"
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    # Composite primary key (id, created_at): Postgres requires the partition key in it
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
     change_amount: Mapped[float] = mapped_column(Float, nullable=False) # +50 or -10
     type: Mapped[MovementType] = mapped_column(SAEnum(MovementType), nullable=False)
     performed_by_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     comment: Mapped[str | None] = mapped_column(String, nullable=True)
-    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
     product: Mapped["Product"] = relationship(back_populates="movements")
     performed_by = relationship("modules.auth.models.User")
+
+    # The table is range-partitioned by month (see modules/inventory/partitions.py).
+    # The PK matches migration b61f4d08e2a7; created_at comes back via RETURNING on insert.
+    __table_args__ = (
+        Index("ix_stock_movements_product_id_created_at_id", "product_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+class StockMonthClosing(Base):
+    """
+    Closing balance of every product for a month whose stock_movements partition
+    was detached (archived). The ledger of the remaining months continues from
+    the latest of these snapshots; nothing is written into the ledger itself.
+    """
+    __tablename__ = "stock_month_closings"
+
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    month: Mapped[Date] = mapped_column(Date, primary_key=True) # 1st day of the archived month
+    quantity: Mapped[float] = mapped_column(Float, nullable=False)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_stock_month_closings_month", "month"),
+    )
@@ -0,0 +1,154 @@
+import asyncio
+from datetime import date
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.config import settings
+
+PARENT_TABLE = "stock_movements"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+def partition_name(year: int, month: int) -> str:
+    return f"{PARENT_TABLE}_y{year}m{month:02d}"
+
+def _add_months(year: int, month: int, months: int) -> tuple[int, int]:
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+def create_stock_movement_partition(db: Session, year: int, month: int) -> str:
+    """
+    Creates the monthly partition if it does not exist yet.
+    Indexes declared on the parent table are created on it automatically.
+
+    If the month's rows already landed in the default partition (partitions were
+    not created in time), Postgres refuses to create it. The default partition is
+    then detached, the partition created, the rows moved into it and the default
+    reattached, all in the caller's transaction.
+    """
+    name = partition_name(year, month)
+    if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return name
+
+    next_year, next_month = _add_months(year, month, 1)
+    start, end = date(year, month, 1), date(next_year, next_month, 1)
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    in_range = "created_at >= :start AND created_at < :end"
+
+    stranded = db.execute(
+        text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range} LIMIT 1"),
+        {"start": start, "end": end}
+    ).first()
+    if not stranded:
+        db.execute(create)
+        return name
+
+    print(f"Partitions: moving {name} rows out of {DEFAULT_PARTITION}")
+    db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    db.execute(create)
+    db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": start, "end": end}
+    )
+    db.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return name
+
+def ensure_stock_movement_partitions(db: Session, months_ahead: int | None = None) -> List[str]:
+    """
+    Makes sure partitions exist for the current month and the next `months_ahead` months.
+    Safe to run repeatedly and from several workers at once (app startup,
+    the in-process maintenance task, `manage.py db-partitions` from cron).
+    Every month is committed on its own; errors are raised after trying all of them.
+    """
+    if months_ahead is None:
+        months_ahead = settings.STOCK_PARTITIONS_AHEAD
+
+    today = date.today()
+    names = []
+    errors = []
+    for offset in range(months_ahead + 1):
+        year, month = _add_months(today.year, today.month, offset)
+        try:
+            # Serializes workers racing to create the same partition
+            db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": PARENT_TABLE})
+            names.append(create_stock_movement_partition(db, year, month))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            errors.append(f"{partition_name(year, month)}: {e}")
+
+    if errors:
+        raise RuntimeError("Could not create stock_movements partitions: " + "; ".join(errors))
+    return names
+
+async def maintain_stock_movement_partitions(interval_seconds: float):
+    """
+    Background loop for long-running processes: without it a worker that stays
+    up longer than STOCK_PARTITIONS_AHEAD months writes into the default partition.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(_ensure_with_own_session)
+        except Exception as e:
+            print(f"ERROR: stock_movements partition maintenance failed: {e}")
+
+def _ensure_with_own_session() -> List[str]:
+    from db_config import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return ensure_stock_movement_partitions(db)
+    finally:
+        db.close()
+
+def detach_stock_movement_partition(db: Session, year: int, month: int) -> str:
+    """
+    Detaches an old month for archiving. The partition stays as a standalone table
+    that can be dumped and dropped without touching the live ledger.
+    Months are archived oldest first; the month's closing balance per product
+    (previous closing + the month's movements) goes to stock_month_closings,
+    which reconciliation and the monthly stock report read instead of the
+    detached rows. The movement ledger itself gets no synthetic rows.
+    """
+    today = date.today()
+    if (year, month) >= (today.year, today.month):
+        raise HTTPException(status_code=400, detail="Only past months can be detached")
+
+    name = partition_name(year, month)
+    # yYYYYmMM names sort chronologically
+    attached = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent AND c.relname <> :default ORDER BY c.relname"
+        ),
+        {"parent": PARENT_TABLE, "default": DEFAULT_PARTITION}
+    ).scalars().all()
+    if name not in attached:
+        raise HTTPException(status_code=404, detail=f"Partition {name} not found")
+    if attached[0] != name:
+        raise HTTPException(status_code=400, detail=f"Archive older months first ({attached[0]})")
+
+    db.execute(
+        text(
+            "INSERT INTO stock_month_closings (product_id, month, quantity) "
+            "SELECT p.id, :month, COALESCE(prev.quantity, 0) + COALESCE(m.total, 0) "
+            "FROM products p "
+            "LEFT JOIN stock_month_closings prev ON prev.product_id = p.id "
+            "   AND prev.month = (SELECT max(month) FROM stock_month_closings) "
+            f"LEFT JOIN (SELECT product_id, SUM(change_amount) AS total FROM {name} GROUP BY product_id) m "
+            "   ON m.product_id = p.id"
+        ),
+        {"month": date(year, month, 1)}
+    )
+    db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    db.commit()
+    return name
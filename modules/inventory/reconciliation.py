@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from sqlalchemy import select, func, text
+from sqlalchemy.orm import Session
+
+from db_config import SessionLocal
+from .models import Product, StockMovement, MovementType, StockMonthClosing
+
+CHUNK_SIZE = 5000
+WORKERS = 4
+# Float noise from summing thousands of fractional movements (kg etc.)
+TOLERANCE = 1e-6
+
+def _archived_balance():
+    """Closing balance of the latest archived month: where the live ledger starts."""
+    return select(StockMonthClosing.product_id, StockMonthClosing.quantity)\
+        .where(StockMonthClosing.month == select(func.max(StockMonthClosing.month)).scalar_subquery())\
+        .subquery()
+
+def _scan_chunk(first_id: int, last_id: int) -> List[dict]:
+    """
+    Compares Product.quantity with the archived balance + SUM(change_amount) for one id range.
+    Runs in its own read-only transaction, so it takes no row locks.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(text("SET TRANSACTION READ ONLY"))
+
+        ledger = select(
+            StockMovement.product_id,
+            func.sum(StockMovement.change_amount).label("ledger_quantity")
+        ).where(
+            StockMovement.product_id.between(first_id, last_id)
+        ).group_by(StockMovement.product_id).subquery()
+
+        archived = _archived_balance()
+        ledger_quantity = func.coalesce(archived.c.quantity, 0) + func.coalesce(ledger.c.ledger_quantity, 0)
+        rows = db.execute(
+            select(Product.id, Product.name, Product.quantity, ledger_quantity.label("ledger_quantity"))
+            .outerjoin(ledger, ledger.c.product_id == Product.id)
+            .outerjoin(archived, archived.c.product_id == Product.id)
+            .where(
+                Product.id.between(first_id, last_id),
+                func.abs(Product.quantity - ledger_quantity) > TOLERANCE
+            )
+            .order_by(Product.id)
+        ).all()
+    finally:
+        db.close()
+
+    return [
+        {
+            "product_id": r.id,
+            "name": r.name,
+            "quantity": float(r.quantity),
+            "ledger_quantity": float(r.ledger_quantity),
+            "drift": float(r.quantity) - float(r.ledger_quantity)
+        }
+        for r in rows
+    ]
+
+def _fix_drift(db: Session, product_id: int, user_id: int) -> bool:
+    """
+    Writes an ADJUSTMENT movement so the ledger matches Product.quantity.
+    The product row is locked only for this short transaction, and the drift
+    is recomputed under the lock in case a sale happened since the scan.
+    """
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
+    if not product:
+        db.rollback()
+        return False
+
+    ledger_quantity = db.query(
+        func.coalesce(func.sum(StockMovement.change_amount), 0)
+    ).filter(StockMovement.product_id == product_id).scalar()
+    archived = _archived_balance()
+    ledger_quantity += db.query(func.coalesce(func.sum(archived.c.quantity), 0))\
+        .filter(archived.c.product_id == product_id).scalar()
+
+    drift = float(product.quantity) - float(ledger_quantity)
+    if abs(drift) <= TOLERANCE:
+        db.rollback()
+        return False
+
+    # Only the ledger is corrected: Product.quantity stays as it is
+    db.add(StockMovement(
+        product_id=product_id,
+        change_amount=drift,
+        type=MovementType.ADJUSTMENT,
+        comment="Сверка остатков: выравнивание журнала движений",
+        performed_by_id=user_id
+    ))
+    db.commit()
+    return True
+
+def reconcile_stock(db: Session, fix: bool = False, user_id: int | None = None) -> dict:
+    """
+    Checks every product against its movement ledger.
+    - Products are split into id ranges of CHUNK_SIZE scanned by WORKERS threads in parallel.
+    - With fix=True each drifted product gets an ADJUSTMENT movement (requires user_id).
+    """
+    first_id, last_id, products_checked = db.query(
+        func.min(Product.id), func.max(Product.id), func.count(Product.id)
+    ).one()
+    # Release the caller's connection while the workers run
+    db.rollback()
+
+    drifted = []
+    if products_checked:
+        ranges = [
+            (start, min(start + CHUNK_SIZE - 1, last_id))
+            for start in range(first_id, last_id + 1, CHUNK_SIZE)
+        ]
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            for chunk in pool.map(lambda r: _scan_chunk(*r), ranges):
+                drifted.extend(chunk)
+
+    fixed = 0
+    if fix:
+        if user_id is None:
+            raise ValueError("user_id is required to write ADJUSTMENT movements")
+        for item in drifted:
+            if _fix_drift(db, item["product_id"], user_id):
+                fixed += 1
+
+    return {
+        "products_checked": products_checked,
+        "drifted": drifted,
+        "fixed": fixed
+    }
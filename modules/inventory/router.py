@@ -1,12 +1,14 @@
+import codecs
 from typing import List, Union, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, UploadFile, File
 from sqlalchemy.orm import Session
 
 from db_config import get_db
 from modules.auth.dependencies import get_current_active_user, require_admin, require_manager
 from modules.auth.models import User, UserRole
 
-from . import service
+from . import service, reconciliation
+from .alerts import push_stock_alerts
 from .models import Product
 from .schemas import (
     ProductCreate,
@@ -14,8 +16,11 @@ from .schemas import (
     ProductReadManager,
     ProductReadWorker,
     StockMovementCreate,
-    StockMovementRead,
-    ProductUpdate
+    StockMovementPage,
+    ProductUpdate,
+    ProductImportReport,
+    ProductLookupResult,
+    StockReconciliationReport
 )
 
 router = APIRouter()
@@ -28,6 +33,27 @@ def create_product(
 ):
     return service.create_product(db=db, product=product)
 
+@router.post("/products/import", response_model=ProductImportReport)
+def import_products(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Bulk import of a supplier catalog from CSV.
+    Columns follow ProductCreate: name, unit, buy_price, recommended_price,
+    description, items_per_pack, min_stock_level.
+    """
+    if not file.filename or not file.filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Only .csv files are supported")
+
+    # Decode lazily line by line: the upload is never loaded into memory as a whole
+    lines = codecs.iterdecode(file.file, "utf-8-sig")
+    try:
+        return service.import_products_csv(db=db, lines=lines)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+
 @router.get("/products", response_model=List[Union[ProductReadAdmin, ProductReadManager, ProductReadWorker]])
 def read_products(
     skip: int = 0,
@@ -53,26 +79,66 @@ def read_products(
     else:
         return [ProductReadWorker.model_validate(p) for p in products]
 
+@router.get("/products/lookup", response_model=ProductLookupResult)
+def lookup_products(
+    codes: List[str] = Query(..., description="SKU or barcode, repeat the parameter for a whole basket"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    return service.lookup_products_by_code(db=db, codes=codes)
+
+@router.get("/products/low-stock", response_model=List[Union[ProductReadAdmin, ProductReadManager, ProductReadWorker]])
+def read_low_stock_products(
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    products = service.get_low_stock_products(db=db, skip=skip, limit=limit)
+
+    if current_user.role == UserRole.ADMIN:
+        return [ProductReadAdmin.model_validate(p) for p in products]
+    elif current_user.role == UserRole.MANAGER:
+        return [ProductReadManager.model_validate(p) for p in products]
+    else:
+        return [ProductReadWorker.model_validate(p) for p in products]
+
 @router.post("/movements")
 def create_movement(
     movement: StockMovementCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     if current_user.role == UserRole.WORKER:
         raise HTTPException(status_code=403, detail="Workers cannot modify stock")
         
-    return service.process_stock_movement(db=db, movement=movement, user=current_user)
+    db_movement = service.process_stock_movement(db=db, movement=movement, user=current_user)
+    # Pushed after the response is sent, so the till never waits on WebSockets
+    background_tasks.add_task(push_stock_alerts, db_movement.stock_alerts)
+    return db_movement
 
-@router.get("/products/{product_id}/movements", response_model=List[StockMovementRead])
+@router.post("/reconcile", response_model=StockReconciliationReport)
+def reconcile_stock(
+    fix: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Сверка Product.quantity с журналом движений.
+    fix=true дописывает ADJUSTMENT-движения для расхождений.
+    """
+    return reconciliation.reconcile_stock(db=db, fix=fix, user_id=current_user.id)
+
+@router.get("/products/{product_id}/movements", response_model=StockMovementPage)
 def read_product_movements(
     product_id: int,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    return service.get_product_movements(db, product_id, skip, limit)
+    return service.get_product_movements(db, product_id, cursor, limit)
 
 @router.put("/products/{product_id}", response_model=ProductReadAdmin)
 def update_product(
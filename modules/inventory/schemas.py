@@ -1,17 +1,30 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, field_validator
 from enum import Enum
-from typing import Optional
+from typing import Optional, List
 from decimal import Decimal
 from .models import MovementType
 from datetime import datetime
 
+def _blank_code_to_none(value: Optional[str]) -> Optional[str]:
+    # "" is not a code: storing it would make the second product without one a duplicate
+    if isinstance(value, str):
+        value = value.strip()
+    return value or None
+
 class ProductBase(BaseModel):
     name: str
+    sku: Optional[str] = None
+    barcode: Optional[str] = None
     description: Optional[str] = None
     unit: str
     items_per_pack: int = 1 # Добавили поле
     min_stock_level: Optional[float] = 10.0
 
+    @field_validator("sku", "barcode")
+    @classmethod
+    def normalize_codes(cls, value: Optional[str]) -> Optional[str]:
+        return _blank_code_to_none(value)
+
 class ProductCreate(ProductBase):
     buy_price: Decimal
     # Делаем цену продажи необязательной при создании
@@ -19,6 +32,8 @@ class ProductCreate(ProductBase):
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
+    sku: Optional[str] = None
+    barcode: Optional[str] = None
     description: Optional[str] = None
     unit: Optional[str] = None
     items_per_pack: Optional[int] = None
@@ -26,6 +41,11 @@ class ProductUpdate(BaseModel):
     recommended_price: Optional[Decimal] = None
     min_stock_level: Optional[float] = None
 
+    @field_validator("sku", "barcode")
+    @classmethod
+    def normalize_codes(cls, value: Optional[str]) -> Optional[str]:
+        return _blank_code_to_none(value)
+
 # --- Response Schemas ---
 
 class ProductReadWorker(ProductBase):
@@ -41,6 +61,22 @@ class ProductReadManager(ProductReadWorker):
 class ProductReadAdmin(ProductReadManager):
     buy_price: Decimal
 
+class ProductScanRead(BaseModel):
+    # Only catalog fields: they rarely change, so they can live in the code cache
+    id: int
+    name: str
+    unit: str
+    items_per_pack: int
+    sku: Optional[str] = None
+    barcode: Optional[str] = None
+    recommended_price: Optional[Decimal] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductLookupResult(BaseModel):
+    found: dict[str, ProductScanRead]
+    missing: List[str]
+
 class StockMovementCreate(BaseModel):
     product_id: int
     change_amount: float
@@ -55,4 +91,34 @@ class StockMovementRead(BaseModel):
     comment: Optional[str] = None
     performed_by_name: Optional[str] = None
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class StockMovementLedgerRead(StockMovementRead):
+    balance_after: float # Остаток товара после этого движения
+
+class StockMovementPage(BaseModel):
+    items: List[StockMovementLedgerRead]
+    next_cursor: Optional[str] = None
+
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+class ProductImportReport(BaseModel):
+    created: int = 0
+    updated: int = 0
+    errors_total: int = 0
+    errors: List[ProductImportError] = [] # Первые 1000 ошибок (все считаются в errors_total)
+
+
+class StockDriftItem(BaseModel):
+    product_id: int
+    name: str
+    quantity: float
+    ledger_quantity: float
+    drift: float
+
+class StockReconciliationReport(BaseModel):
+    products_checked: int
+    drifted: List[StockDriftItem]
+    fixed: int = 0
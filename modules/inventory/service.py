@@ -1,10 +1,17 @@
-from typing import Optional, List
+import csv
+from typing import Optional, List, Iterable
 from decimal import Decimal
+from sqlalchemy import insert, update, func, literal, tuple_, Float
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from pydantic import ValidationError
 from .models import Product, StockMovement, MovementType
-from .schemas import ProductCreate, StockMovementCreate, ProductUpdate
+from .schemas import ProductCreate, StockMovementCreate, ProductUpdate, ProductImportReport, ProductImportError
+from .alerts import stock_threshold_alert
+from .codes import product_codes
 from modules.auth.models import User
+from core.pagination import encode_cursor, decode_cursor, cursor_datetime
 from modules.expenses.models import Expense, ExpenseCategory
 
 def get_products(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[Product]:
@@ -15,13 +22,140 @@ def get_products(db: Session, skip: int = 0, limit: int = 100, search: Optional[
         
     return query.offset(skip).limit(limit).all()
 
+def get_low_stock_products(db: Session, skip: int = 0, limit: int = 100) -> List[Product]:
+    # Served by the partial index ix_products_low_stock
+    return db.query(Product)\
+        .filter(Product.quantity < Product.min_stock_level)\
+        .order_by(Product.name)\
+        .offset(skip).limit(limit).all()
+
+def _check_unique_codes(db: Session, sku: Optional[str], barcode: Optional[str], product_id: Optional[int] = None):
+    for field, value in (("sku", sku), ("barcode", barcode)):
+        if not value:
+            continue
+        query = db.query(Product.id).filter(getattr(Product, field) == value)
+        if product_id is not None:
+            query = query.filter(Product.id != product_id)
+        if query.first():
+            raise HTTPException(status_code=400, detail=f"Product with this {field} already exists")
+
+def lookup_products_by_code(db: Session, codes: List[str]) -> dict:
+    # Served from the in-memory SKU/barcode map: no queries while it is fresh
+    return product_codes.lookup(db, codes)
+
 def create_product(db: Session, product: ProductCreate) -> Product:
+    _check_unique_codes(db, product.sku, product.barcode)
     db_product = Product(**product.model_dump())
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
     return db_product
 
+IMPORT_BATCH_SIZE = 500
+# Rows listed in the report; beyond that only errors_total keeps counting
+IMPORT_MAX_ERRORS = 1000
+
+def import_products_csv(db: Session, lines: Iterable[str]) -> ProductImportReport:
+    """
+    Streams CSV rows into the catalog in batches of IMPORT_BATCH_SIZE.
+    - Each row is validated with ProductCreate; invalid rows go to the error report.
+    - Products are matched by name: existing ones are updated, the rest inserted.
+      Updates only touch the columns present in the row, so a price-only file
+      does not reset descriptions, codes or stock levels to schema defaults.
+      A name shared by several catalog products is ambiguous and reported, not guessed.
+    - Every batch is committed on its own and at most IMPORT_MAX_ERRORS errors
+      are listed, so memory stays flat for any file size.
+    """
+    report = ProductImportReport()
+    batch: dict[str, tuple[int, ProductCreate]] = {}
+
+    reader = csv.DictReader(lines)
+    for row in reader:
+        # Physical line in the file (header is line 1); correct even when a
+        # quoted field spans several lines
+        row_number = reader.line_num
+        fields = {
+            key.strip(): value.strip()
+            for key, value in row.items()
+            if key and isinstance(value, str) and value.strip()
+        }
+        try:
+            product = ProductCreate(**fields)
+        except ValidationError as e:
+            message = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            _report_error(report, row_number, message)
+            continue
+
+        # Later rows with the same name win, like sequential POSTs would
+        batch[product.name] = (row_number, product)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            _upsert_product_batch(db, batch, report)
+            batch.clear()
+
+    if batch:
+        _upsert_product_batch(db, batch, report)
+
+    return report
+
+def _report_error(report: ProductImportReport, row_number: int, message: str):
+    report.errors_total += 1
+    if len(report.errors) < IMPORT_MAX_ERRORS:
+        report.errors.append(ProductImportError(row=row_number, error=message))
+
+def _upsert_product_batch(db: Session, batch: dict[str, tuple[int, ProductCreate]], report: ProductImportReport):
+    existing: dict[str, int] = {}
+    ambiguous = set()
+    for name, product_id in db.query(Product.name, Product.id).filter(Product.name.in_(list(batch.keys()))):
+        if name in existing:
+            ambiguous.add(name)
+        existing[name] = product_id
+
+    rows = []
+    for name, (row_number, product) in batch.items():
+        if name in ambiguous:
+            _report_error(report, row_number, "several products have this name, update them by id")
+        else:
+            rows.append((row_number, product))
+
+    try:
+        _write_product_rows(db, rows, existing, report)
+    except IntegrityError:
+        db.rollback()
+        # A duplicate SKU/barcode fails the whole statement: retry row by row to find it
+        for row_number, product in rows:
+            try:
+                _write_product_rows(db, [(row_number, product)], existing, report)
+            except IntegrityError:
+                db.rollback()
+                _report_error(report, row_number, "sku or barcode already belongs to another product")
+    # Bulk statements bypass the ORM events that normally refresh the code map
+    product_codes.invalidate()
+
+def _write_product_rows(
+    db: Session,
+    rows: List[tuple[int, ProductCreate]],
+    existing: dict[str, int],
+    report: ProductImportReport
+):
+    # Bulk UPDATE by primary key groups rows by their key sets, so each row
+    # may carry only its own columns
+    to_update = [
+        {"id": existing[product.name], **product.model_dump(exclude_unset=True)}
+        for _, product in rows if product.name in existing
+    ]
+    to_insert = [product.model_dump() for _, product in rows if product.name not in existing]
+
+    if to_update:
+        db.execute(update(Product), to_update)
+    if to_insert:
+        db.execute(insert(Product), to_insert)
+    db.commit()
+
+    report.updated += len(to_update)
+    report.created += len(to_insert)
+
 def process_stock_movement(db: Session, movement: StockMovementCreate, user: User) -> StockMovement:
     """
     Unified function to handle stock movements.
@@ -34,6 +168,7 @@ def process_stock_movement(db: Session, movement: StockMovementCreate, user: Use
         raise HTTPException(status_code=404, detail="Product not found")
 
     final_change_amount = movement.change_amount
+    previous_quantity = product.quantity
 
     if movement.type == MovementType.OUT:
         if product.quantity < movement.change_amount:
@@ -67,30 +202,86 @@ def process_stock_movement(db: Session, movement: StockMovementCreate, user: Use
         performed_by_id=user.id
     )
     
+    alert = stock_threshold_alert(product, previous_quantity)
+
     db.add(db_movement)
     db.commit()
     db.refresh(db_movement)
     db.refresh(db_movement)
+
+    db_movement.stock_alerts = [alert] if alert else []
     return db_movement
 
-def get_product_movements(db: Session, product_id: int, skip: int = 0, limit: int = 100):
-    results = db.query(StockMovement, User)\
-        .join(User, StockMovement.performed_by_id == User.id)\
-        .filter(StockMovement.product_id == product_id)\
-        .order_by(StockMovement.created_at.desc())\
-        .offset(skip).limit(limit).all()
-        
+def get_product_movements(db: Session, product_id: int, cursor: Optional[str] = None, limit: int = 100) -> dict:
+    """
+    Movement ledger, newest first, with the product balance after every movement.
+    - Balance is anchored on the current Product.quantity and walked backwards
+      with a window sum, so only the requested page is read.
+    - The cursor carries the balance below the last row, so the next page
+      continues from it via the (product_id, created_at, id) index.
+    """
+    position = decode_cursor(cursor)
+
+    query = db.query(StockMovement).filter(StockMovement.product_id == product_id)
+    if position:
+        try:
+            anchor = float(position["balance"])
+            last_id = int(position["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            tuple_(StockMovement.created_at, StockMovement.id) < tuple_(cursor_datetime(position), last_id)
+        )
+    else:
+        product = db.query(Product.quantity).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        anchor = float(product.quantity)
+
+    page = query.with_entities(
+        StockMovement.id,
+        StockMovement.created_at,
+        StockMovement.type,
+        StockMovement.change_amount,
+        StockMovement.comment,
+        StockMovement.performed_by_id
+    ).order_by(StockMovement.created_at.desc(), StockMovement.id.desc()).limit(limit).subquery()
+
+    newest_first = (page.c.created_at.desc(), page.c.id.desc())
+    # Sum of everything newer than the row within this page
+    newer_changes = func.coalesce(
+        func.sum(page.c.change_amount).over(order_by=newest_first, rows=(None, -1)), 0
+    )
+
+    results = db.query(
+        page,
+        User.username,
+        (literal(anchor, Float) - newer_changes).label("balance_after")
+    ).join(User, User.id == page.c.performed_by_id)\
+        .order_by(*newest_first).all()
+
     movements = []
-    for m, u in results:
+    for r in results:
         movements.append({
-            "id": m.id,
-            "created_at": m.created_at,
-            "type": m.type,
-            "change_amount": m.change_amount,
-            "comment": m.comment,
-            "performed_by_name": u.username
+            "id": r.id,
+            "created_at": r.created_at,
+            "type": r.type,
+            "change_amount": r.change_amount,
+            "comment": r.comment,
+            "performed_by_name": r.username,
+            "balance_after": r.balance_after
+        })
+
+    next_cursor = None
+    if len(results) == limit:
+        last = results[-1]
+        next_cursor = encode_cursor({
+            "created_at": last.created_at,
+            "id": last.id,
+            "balance": last.balance_after - last.change_amount
         })
-    return movements
+
+    return {"items": movements, "next_cursor": next_cursor}
 
 def update_product(db: Session, product_id: int, data: ProductUpdate) -> Product:
     product = db.query(Product).filter(Product.id == product_id).first()
@@ -98,6 +289,7 @@ def update_product(db: Session, product_id: int, data: ProductUpdate) -> Product
         raise HTTPException(status_code=404, detail="Product not found")
 
     update_data = data.model_dump(exclude_unset=True)
+    _check_unique_codes(db, update_data.get("sku"), update_data.get("barcode"), product_id=product_id)
     for key, value in update_data.items():
         setattr(product, key, value)
 
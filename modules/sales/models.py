@@ -1,4 +1,4 @@
-from sqlalchemy import Float, DateTime, func, ForeignKey, Numeric, String,Boolean
+from sqlalchemy import Float, DateTime, func, ForeignKey, Numeric, String,Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db_config import Base
 
@@ -16,6 +16,10 @@ class Sale(Base):
     seller = relationship("modules.auth.models.User")
     items: Mapped[list["SaleItem"]] = relationship(back_populates="sale")
 
+    __table_args__ = (
+        Index("ix_sales_client_id_created_at", "client_id", "created_at"),
+    )
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
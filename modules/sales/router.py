@@ -1,10 +1,11 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from db_config import get_db
 from modules.auth.dependencies import require_manager, require_admin
 from modules.auth.models import User
+from modules.inventory.alerts import push_stock_alerts
 
 from . import service
 from .models import Sale
@@ -23,10 +24,13 @@ router = APIRouter()
 @router.post("/sales", response_model=SaleRead)
 def create_sale(
     sale: SaleCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
-    return service.create_sale(db=db, sale_data=sale, seller=current_user)
+    db_sale = service.create_sale(db=db, sale_data=sale, seller=current_user)
+    background_tasks.add_task(push_stock_alerts, db_sale.stock_alerts)
+    return db_sale
 
 @router.get("/sales", response_model=List[SaleRead])
 def read_sales(
@@ -55,10 +59,13 @@ def read_sale(
 def refund_sale(
     sale_id: int,
     refund: RefundCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
-    return service.create_refund(db=db, sale_id=sale_id, refund_data=refund, user=current_user)
+    db_refund = service.create_refund(db=db, sale_id=sale_id, refund_data=refund, user=current_user)
+    background_tasks.add_task(push_stock_alerts, db_refund.stock_alerts)
+    return db_refund
 
 @router.get("/refunds", response_model=List[RefundRead])
 def read_refunds(
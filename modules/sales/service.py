@@ -1,10 +1,11 @@
 from decimal import Decimal
 from sqlalchemy.orm import Session, joinedload
 from fastapi import HTTPException
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from .models import Sale, SaleItem, Refund, RefundItem
 from .schemas import SaleCreate, RefundCreate
 from modules.inventory.models import Product, StockMovement, MovementType
+from modules.inventory.alerts import stock_threshold_alert
 from modules.clients.models import Client
 from modules.auth.models import User
 from core.utils import get_date_range
@@ -97,6 +98,7 @@ def create_sale(db: Session, sale_data: SaleCreate, seller: User) -> Sale:
     db.flush()
 
     # 4. Process Items (Add SaleItem, Deduct Stock)
+    previous_quantities = {}
     for data in sale_items_data:
         product = data["product"]
         quantity = data["quantity"]
@@ -122,8 +124,14 @@ def create_sale(db: Session, sale_data: SaleCreate, seller: User) -> Sale:
         db.add(movement)
         
         # Update Product Quantity
+        previous_quantities.setdefault(product.id, (product, product.quantity))
         product.quantity -= quantity
 
+    stock_alerts = [
+        alert for product, previous in previous_quantities.values()
+        if (alert := stock_threshold_alert(product, previous))
+    ]
+
     # 5. Update Client Debt
     if sale_data.client_id:
         client = db.query(Client).filter(Client.id == sale_data.client_id).with_for_update().first()
@@ -140,6 +148,12 @@ def create_sale(db: Session, sale_data: SaleCreate, seller: User) -> Sale:
              client.total_debt = 0.0
         else:
              client.total_debt = current_debt + debt_change
+
+        # Lifetime metrics (same transaction, so now() equals Sale.created_at).
+        # Incremented in SQL on the Numeric column: no float rounding
+        client.lifetime_revenue = Client.lifetime_revenue + total_amount
+        client.sales_count = Client.sales_count + 1
+        client.last_sale_at = func.now()
         db.add(client)
 
     db.commit()
@@ -147,6 +161,7 @@ def create_sale(db: Session, sale_data: SaleCreate, seller: User) -> Sale:
     
     # 6. ВАЖНО: Исправили переменную на 'seller'
     db_sale.seller_name = seller.username
+    db_sale.stock_alerts = stock_alerts
     
     return db_sale
 
@@ -192,6 +207,7 @@ def create_refund(db: Session, sale_id: int, refund_data: RefundCreate, user: Us
     db.add(db_refund)
     db.flush()
 
+    previous_quantities = {}
     for data in refund_items_data:
         db_refund_item = RefundItem(
             refund_id=db_refund.id,
@@ -212,8 +228,14 @@ def create_refund(db: Session, sale_id: int, refund_data: RefundCreate, user: Us
         
         product = db.query(Product).filter(Product.id == data["product_id"]).with_for_update().first()
         if product:
+             previous_quantities.setdefault(product.id, (product, product.quantity))
              product.quantity += data["quantity"]
 
+    stock_alerts = [
+        alert for product, previous in previous_quantities.values()
+        if (alert := stock_threshold_alert(product, previous))
+    ]
+
     if sale.client_id:
         client = db.query(Client).filter(Client.id == sale.client_id).with_for_update().first()
         if client:
@@ -221,9 +243,11 @@ def create_refund(db: Session, sale_id: int, refund_data: RefundCreate, user: Us
                  client.total_debt = 0
              else:
                  client.total_debt -= float(total_refund_amount)
+             client.lifetime_revenue = Client.lifetime_revenue - total_refund_amount
 
     db.commit()
     db.refresh(db_refund)
+    db_refund.stock_alerts = stock_alerts
     return db_refund
 
 def get_refunds(db: Session, skip: int = 0, limit: int = 100) -> list[Refund]:
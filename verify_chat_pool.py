@@ -0,0 +1,51 @@
+import sys
+import os
+import time
+from contextlib import ExitStack
+
+# Add root to python path
+sys.path.append(os.getcwd())
+
+from fastapi.testclient import TestClient
+
+from db_config import SessionLocal, engine
+from main import app
+from modules.auth.models import User, UserRole
+from modules.auth.security import create_access_token
+
+SOCKETS = 20
+
+def verify():
+    # 1. Test user + token
+    print("--- 1. Setting up User ---")
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "test_chat_pool").first()
+        if not user:
+            user = User(username="test_chat_pool", hashed_password="pw", role=UserRole.WORKER, is_active=True)
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        token = create_access_token(data={"sub": user.username, "role": user.role.value})
+        print(f"User: {user.username} (ID: {user.id})")
+    finally:
+        db.close()
+
+    # 2. Open N sockets and leave them idle
+    print(f"\n--- 2. Opening {SOCKETS} idle WebSockets ---")
+    with TestClient(app) as client, ExitStack() as stack:
+        for _ in range(SOCKETS):
+            stack.enter_context(client.websocket_connect(f"/api/chat/ws?token={token}"))
+
+        time.sleep(0.5)
+        checked_out = engine.pool.checkedout()
+        print(f"Pooled connections checked out: {checked_out}")
+
+        if checked_out == 0:
+            print(f"SUCCESS: {SOCKETS} idle sockets hold no database connections.")
+        else:
+            print(f"FAILURE: {checked_out} connections held by idle sockets (expected 0).")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    verify()